@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of the scoreLattes script.
+#
+# Copyright (C) 2017 Vicente Helano
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import itertools
+
+try:
+    import xml.etree.cElementTree as ET
+except ImportError:
+    import xml.etree.ElementTree as ET
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+# Itens de produção de cada categoria: caminho dos itens a partir da raiz e
+# atributos extraídos de cada item, na forma 'ELEMENTO/@ATRIBUTO'. Atributos
+# ou elementos ausentes são extraídos como ''. O último atributo é o título do
+# item, que o identifica entre os currículos de um programa.
+CONSULTAS = {
+    'ARTIGOS': ('PRODUCAO-BIBLIOGRAFICA/ARTIGOS-PUBLICADOS/ARTIGO-PUBLICADO', [
+        'DADOS-BASICOS-DO-ARTIGO/@ANO-DO-ARTIGO',
+        'DADOS-BASICOS-DO-ARTIGO/@DOI',
+        'DETALHAMENTO-DO-ARTIGO/@ISSN',
+        'DETALHAMENTO-DO-ARTIGO/@TITULO-DO-PERIODICO-OU-REVISTA',
+        'DADOS-BASICOS-DO-ARTIGO/@TITULO-DO-ARTIGO']),
+    'TRABALHOS-EM-EVENTOS': ('PRODUCAO-BIBLIOGRAFICA/TRABALHOS-EM-EVENTOS/TRABALHO-EM-EVENTOS', [
+        'DADOS-BASICOS-DO-TRABALHO/@ANO-DO-TRABALHO',
+        'DETALHAMENTO-DO-TRABALHO/@CLASSIFICACAO-DO-EVENTO',
+        'DADOS-BASICOS-DO-TRABALHO/@NATUREZA',
+        'DADOS-BASICOS-DO-TRABALHO/@TITULO-DO-TRABALHO']),
+    'LIVROS': ('PRODUCAO-BIBLIOGRAFICA/LIVROS-E-CAPITULOS/LIVROS-PUBLICADOS-OU-ORGANIZADOS/LIVRO-PUBLICADO-OU-ORGANIZADO', [
+        'DADOS-BASICOS-DO-LIVRO/@ANO',
+        'DETALHAMENTO-DO-LIVRO/@NUMERO-DE-PAGINAS',
+        'DADOS-BASICOS-DO-LIVRO/@TIPO',
+        'DADOS-BASICOS-DO-LIVRO/@TITULO-DO-LIVRO']),
+    'CAPITULOS': ('PRODUCAO-BIBLIOGRAFICA/LIVROS-E-CAPITULOS/CAPITULOS-DE-LIVROS-PUBLICADOS/CAPITULO-DE-LIVRO-PUBLICADO', [
+        'DADOS-BASICOS-DO-CAPITULO/@ANO',
+        'DADOS-BASICOS-DO-CAPITULO/@TITULO-DO-CAPITULO-DO-LIVRO']),
+    'TRADUCOES': ('PRODUCAO-BIBLIOGRAFICA/DEMAIS-TIPOS-DE-PRODUCAO-BIBLIOGRAFICA/TRADUCAO', [
+        'DADOS-BASICOS-DA-TRADUCAO/@ANO',
+        'DETALHAMENTO-DA-TRADUCAO/@NUMERO-DE-PAGINAS',
+        'DADOS-BASICOS-DA-TRADUCAO/@TITULO']),
+    'SOFTWARES': ('PRODUCAO-TECNICA/SOFTWARE', [
+        'DADOS-BASICOS-DO-SOFTWARE/@ANO',
+        'DADOS-BASICOS-DO-SOFTWARE/@TITULO-DO-SOFTWARE']),
+    'PATENTES': ('PRODUCAO-TECNICA/PATENTE', [
+        'DETALHAMENTO-DA-PATENTE/REGISTRO-OU-PATENTE/@DATA-PEDIDO-DE-DEPOSITO',
+        'DETALHAMENTO-DA-PATENTE/REGISTRO-OU-PATENTE/@DATA-DE-CONCESSAO',
+        'DADOS-BASICOS-DA-PATENTE/@TITULO']),
+    'PRODUTOS-TECNOLOGICOS': ('PRODUCAO-TECNICA/PRODUTO-TECNOLOGICO', [
+        'DADOS-BASICOS-DO-PRODUTO-TECNOLOGICO/@ANO',
+        'DADOS-BASICOS-DO-PRODUTO-TECNOLOGICO/@TITULO-DO-PRODUTO']),
+    'PROCESSOS-OU-TECNICAS': ('PRODUCAO-TECNICA/PROCESSOS-OU-TECNICAS', [
+        'DADOS-BASICOS-DO-PROCESSOS-OU-TECNICAS/@ANO',
+        'DADOS-BASICOS-DO-PROCESSOS-OU-TECNICAS/@TITULO-DO-PROCESSO']),
+    'TRABALHOS-TECNICOS': ('PRODUCAO-TECNICA/TRABALHO-TECNICO', [
+        'DADOS-BASICOS-DO-TRABALHO-TECNICO/@ANO',
+        'DADOS-BASICOS-DO-TRABALHO-TECNICO/@TITULO-DO-TRABALHO-TECNICO']),
+    'APRESENTACOES-DE-OBRAS-ARTISTICAS': ('OUTRA-PRODUCAO/PRODUCAO-ARTISTICA-CULTURAL/APRESENTACAO-DE-OBRA-ARTISTICA', [
+        'DADOS-BASICOS-DA-APRESENTACAO-DE-OBRA-ARTISTICA/@ANO',
+        'DADOS-BASICOS-DA-APRESENTACAO-DE-OBRA-ARTISTICA/@TITULO']),
+    'COMPOSICOES-MUSICAIS': ('OUTRA-PRODUCAO/PRODUCAO-ARTISTICA-CULTURAL/COMPOSICAO-MUSICAL', [
+        'DADOS-BASICOS-DA-COMPOSICAO-MUSICAL/@ANO',
+        'DADOS-BASICOS-DA-COMPOSICAO-MUSICAL/@TITULO']),
+    'OBRAS-DE-ARTES-VISUAIS': ('OUTRA-PRODUCAO/PRODUCAO-ARTISTICA-CULTURAL/OBRA-DE-ARTES-VISUAIS', [
+        'DADOS-BASICOS-DA-OBRA-DE-ARTES-VISUAIS/@ANO',
+        'DADOS-BASICOS-DA-OBRA-DE-ARTES-VISUAIS/@TITULO']),
+    'ORIENTACOES-POS-DOUTORADO': ('OUTRA-PRODUCAO/ORIENTACOES-CONCLUIDAS/ORIENTACOES-CONCLUIDAS-PARA-POS-DOUTORADO', [
+        'DADOS-BASICOS-DE-ORIENTACOES-CONCLUIDAS-PARA-POS-DOUTORADO/@ANO',
+        'DADOS-BASICOS-DE-ORIENTACOES-CONCLUIDAS-PARA-POS-DOUTORADO/@TITULO']),
+    'ORIENTACOES-DOUTORADO': ('OUTRA-PRODUCAO/ORIENTACOES-CONCLUIDAS/ORIENTACOES-CONCLUIDAS-PARA-DOUTORADO', [
+        'DADOS-BASICOS-DE-ORIENTACOES-CONCLUIDAS-PARA-DOUTORADO/@ANO',
+        'DETALHAMENTO-DE-ORIENTACOES-CONCLUIDAS-PARA-DOUTORADO/@TIPO-DE-ORIENTACAO',
+        'DADOS-BASICOS-DE-ORIENTACOES-CONCLUIDAS-PARA-DOUTORADO/@TITULO']),
+    'ORIENTACOES-MESTRADO': ('OUTRA-PRODUCAO/ORIENTACOES-CONCLUIDAS/ORIENTACOES-CONCLUIDAS-PARA-MESTRADO', [
+        'DADOS-BASICOS-DE-ORIENTACOES-CONCLUIDAS-PARA-MESTRADO/@ANO',
+        'DETALHAMENTO-DE-ORIENTACOES-CONCLUIDAS-PARA-MESTRADO/@TIPO-DE-ORIENTACAO',
+        'DADOS-BASICOS-DE-ORIENTACOES-CONCLUIDAS-PARA-MESTRADO/@TITULO']),
+    'OUTRAS-ORIENTACOES': ('OUTRA-PRODUCAO/ORIENTACOES-CONCLUIDAS/OUTRAS-ORIENTACOES-CONCLUIDAS', [
+        'DADOS-BASICOS-DE-OUTRAS-ORIENTACOES-CONCLUIDAS/@ANO',
+        'DADOS-BASICOS-DE-OUTRAS-ORIENTACOES-CONCLUIDAS/@NATUREZA',
+        'DADOS-BASICOS-DE-OUTRAS-ORIENTACOES-CONCLUIDAS/@TITULO']),
+}
+
+class Backend(object):
+    """Leitura e extração com a biblioteca padrão (ElementTree e ElementPath)"""
+    nome = 'etree'
+
+    def __init__(self):
+        # Cada atributo vira (índice do elemento, atributo), e os elementos
+        # distintos de uma categoria são procurados uma única vez por item.
+        self.__consultas = {}
+        for categoria, (itens, atributos) in CONSULTAS.items():
+            elementos = []
+            campos = []
+            for caminho in atributos:
+                elemento, atributo = caminho.split('/@')
+                if elemento not in elementos:
+                    elementos.append(elemento)
+                campos.append( (elementos.index(elemento), atributo) )
+            self.__consultas[categoria] = (itens, elementos, campos)
+
+    def parse(self, fonte):
+        return ET.parse(fonte).getroot()
+
+    def extrai(self, raiz, categoria):
+        """Gera uma tupla de atributos (veja CONSULTAS) por item da categoria"""
+        itens, elementos, campos = self.__consultas[categoria]
+        for item in raiz.iterfind(itens):
+            encontrados = [ item.find(elemento) for elemento in elementos ]
+            yield tuple( '' if encontrados[i] is None else encontrados[i].get(atributo, '') for i, atributo in campos )
+
+class BackendLxml(Backend):
+    """Leitura com lxml e extração com expressões XPath compiladas uma única vez"""
+    nome = 'lxml'
+
+    def __init__(self):
+        Backend.__init__(self)
+        self.__parser = etree.XMLParser(huge_tree=True, remove_comments=True, remove_pis=True)
+
+        # Cada atributo de uma categoria é extraído de todos os itens de uma vez,
+        # como uma coluna de strings ('itens/ELEMENTO/@ATRIBUTO'), sem criar um
+        # objeto Python por nó, que é o que custa caro no lxml. As colunas estão
+        # alinhadas se todos os itens têm todos os atributos e cada coluna tem um
+        # valor por item; do contrário, a categoria é extraída item a item.
+        self.__consultas = {}
+        for categoria, (itens, atributos) in CONSULTAS.items():
+            self.__consultas[categoria] = (
+                etree.XPath('count(%s)' % itens),
+                etree.XPath('count(%s[%s])' % (itens, ' and '.join(atributos))),
+                [ etree.XPath(itens + '/' + caminho, smart_strings=False) for caminho in atributos ])
+
+    def parse(self, fonte):
+        return etree.parse(fonte, self.__parser).getroot()
+
+    def extrai(self, raiz, categoria):
+        total, completos, colunas = self.__consultas[categoria]
+        n = total(raiz)
+        if n == 0:
+            return iter([])
+        if completos(raiz) == n:
+            valores = [ coluna(raiz) for coluna in colunas ]
+            if all( len(coluna) == n for coluna in valores ):
+                return itertools.izip(*valores)
+        return Backend.extrai(self, raiz, categoria)
+
+BACKENDS = { 'etree': Backend }
+if etree is not None:
+    BACKENDS['lxml'] = BackendLxml
+
+_instancias = {}
+
+def backend(nome = None):
+    """O backend pedido (lxml, se disponível, por omissão); as consultas são compiladas uma vez por processo"""
+    if nome is None:
+        nome = 'lxml' if 'lxml' in BACKENDS else 'etree'
+    if nome not in _instancias:
+        _instancias[nome] = BACKENDS[nome]()
+    return _instancias[nome]
+
+def extrai(raiz, categoria):
+    """Extrai a categoria com o backend que produziu a árvore da raiz"""
+    if etree is not None and isinstance(raiz, etree._Element):
+        return backend('lxml').extrai(raiz, categoria)
+    return backend('etree').extrai(raiz, categoria)
+
+# Tempo de leitura e de extração de todas as categorias, por currículo, com
+# cada backend. Sem arquivos, usa um currículo sintético com N itens por categoria.
+if __name__ == "__main__":
+    import sys, time, argparse
+    from StringIO import StringIO
+
+    parser = argparse.ArgumentParser(description="Benchmarks the XML backends on Lattes curricula.")
+    parser.add_argument('arquivos', metavar='FILE', nargs='*',
+        help="XML files containing Lattes curricula")
+    parser.add_argument('-n', '--items', dest='itens', default=2000, metavar='N', type=int,
+        help="items per category of the synthetic curriculum (default: %(default)s)")
+    parser.add_argument('-r', '--repeat', dest='repeticoes', default=5, metavar='R', type=int,
+        help="best of R runs (default: %(default)s)")
+    args = parser.parse_args()
+
+    def sintetico(n):
+        partes = ['<?xml version="1.0" encoding="ISO-8859-1"?><CURRICULO-VITAE NUMERO-IDENTIFICADOR="0">']
+        aninhados = {}
+        for categoria, (itens, atributos) in sorted(CONSULTAS.items()):
+            elementos = itens.split('/')
+            for k in range(n):
+                # Atributos dos elementos filhos de cada item; como nos currículos
+                # exportados, atributos sem informação estão presentes, mas vazios
+                filhos = {}
+                for j, caminho in enumerate(atributos):
+                    elemento, atributo = caminho.split('/@')
+                    filhos.setdefault(elemento, []).append('%s="%s"' % (atributo, 1990 + k % 30 if (k + j) % 7 else ''))
+                item = ''.join( '<%s %s/>' % (elemento, ' '.join(valores)) if '/' not in elemento else
+                    '<%s><%s %s/></%s>' % tuple(elemento.split('/') + [' '.join(valores), elemento.split('/')[0]])
+                    for elemento, valores in sorted(filhos.items()) )
+                # Autores e palavras-chave, como nos currículos reais, não são consultados
+                item += ''.join( '<AUTORES NOME-COMPLETO-DO-AUTOR="Autor %d" ORDEM-DE-AUTORIA="%d"/>' % (a, a) for a in range(4) )
+                item += '<PALAVRAS-CHAVE PALAVRA-CHAVE-1="chave" PALAVRA-CHAVE-2="outra"/>'
+                aninhados.setdefault(tuple(elementos[:-1]), []).append('<%s>%s</%s>' % (elementos[-1], item, elementos[-1]))
+        # Agrupa os itens sob seus ancestrais comuns
+        arvore = {}
+        for ancestrais, itens in aninhados.items():
+            no = arvore
+            for elemento in ancestrais:
+                no = no.setdefault(elemento, {})
+            no.setdefault('', []).extend(itens)
+        def serializa(no):
+            return ''.join(no.get('', [])) + ''.join( '<%s>%s</%s>' % (e, serializa(f), e) for e, f in sorted(no.items()) if e )
+        partes.append(serializa(arvore))
+        partes.append('</CURRICULO-VITAE>')
+        return ''.join(partes)
+
+    if args.arquivos:
+        fontes = [ (arquivo, open(arquivo, 'rb').read()) for arquivo in args.arquivos ]
+    else:
+        fontes = [ ('synthetic, %d items per category' % args.itens, sintetico(args.itens)) ]
+
+    print '%-40s %-6s %9s %12s %10s %10s %10s' % ('curriculum', 'parser', 'items', 'parse (ms)', 'extract', 'total', 'per item')
+    for nome, dados in fontes:
+        extraidos = {}
+        for chave in sorted(BACKENDS):
+            instancia = backend(chave)
+            leitura = extracao = float('inf')
+            for repeticao in range(args.repeticoes):
+                inicio = time.time()
+                raiz = instancia.parse(StringIO(dados))
+                meio = time.time()
+                itens = 0
+                for categoria in CONSULTAS:
+                    for item in instancia.extrai(raiz, categoria):
+                        itens += 1
+                fim = time.time()
+                leitura = min(leitura, meio - inicio)
+                extracao = min(extracao, fim - meio)
+            extraidos[chave] = dict( (categoria, list(instancia.extrai(raiz, categoria))) for categoria in CONSULTAS )
+            print '%-40s %-6s %9d %12.2f %10.2f %10.2f %8.2fus' % (nome[-40:], chave, itens, 1000 * leitura, 1000 * extracao,
+                1000 * (leitura + extracao), 1e6 * extracao / max(itens, 1))
+        if any( extraido != extraidos['etree'] for extraido in extraidos.values() ):
+            print >> sys.stderr, nome + ': backends disagree'
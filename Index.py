@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of the scoreLattes script.
+#
+# Copyright (C) 2017 Vicente Helano
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import os, zlib, zipfile, contextlib
+from collections import OrderedDict
+
+try:
+    import xml.etree.cElementTree as ET
+except ImportError:
+    import xml.etree.ElementTree as ET
+
+# Erros de um arquivo ilegível, que invalidam só o próprio currículo: XML mal
+# formado (ParseError é um SyntaxError), falha de leitura, .zip corrompido ou
+# cifrado (RuntimeError) e .zip sem XML (ValueError).
+ERROS_DE_LEITURA = (SyntaxError, ValueError, EnvironmentError, RuntimeError, zipfile.BadZipfile, zlib.error)
+
+# Os arquivos de currículos sob um diretório (ou o próprio arquivo), em ordem estável.
+# Currículos baixados da Plataforma Lattes vêm num .zip com um único .xml.
+def curriculos(diretorio):
+    if os.path.isfile(diretorio):
+        return [diretorio]
+    caminhos = []
+    for raiz, diretorios, arquivos in os.walk(diretorio):
+        diretorios.sort()
+        caminhos += [ os.path.join(raiz, arquivo) for arquivo in sorted(arquivos) if arquivo.lower().endswith(('.xml', '.zip')) ]
+    return caminhos
+
+@contextlib.contextmanager
+def abre(caminho):
+    """O XML do currículo, de um arquivo .xml ou do primeiro .xml de um .zip,
+    para um bloco with que fecha também o .zip"""
+    if not caminho.lower().endswith('.zip'):
+        with open(caminho, 'rb') as fonte:
+            yield fonte
+        return
+    with zipfile.ZipFile(caminho) as arquivo:
+        nomes = [ nome for nome in arquivo.namelist() if nome.lower().endswith('.xml') ]
+        if not nomes:
+            raise ValueError('no XML curriculum in archive')
+        with arquivo.open(nomes[0]) as fonte:
+            yield fonte
+
+# DATA-ATUALIZACAO (DDMMAAAA) e HORA-ATUALIZACAO (HHMMSS) como AAAAMMDDHHMMSS,
+# que se comparam como texto.
+def atualizacao(atributos):
+    data = atributos.get('DATA-ATUALIZACAO', '')
+    return data[4:8] + data[2:4] + data[0:2] + atributos.get('HORA-ATUALIZACAO', '')
+
+def cabecalho(caminho):
+    """Identificação do currículo, lida só até a abertura de DADOS-GERAIS"""
+    entrada = None
+    with abre(caminho) as fonte:
+        for evento, elemento in ET.iterparse(fonte, events=('start',)):
+            if entrada is None: # a raiz, CURRICULO-VITAE
+                if 'NUMERO-IDENTIFICADOR' not in elemento.attrib:
+                    raise ValueError('no NUMERO-IDENTIFICADOR')
+                entrada = { 'id': elemento.get('NUMERO-IDENTIFICADOR'), 'nome': '',
+                    'atualizacao': atualizacao(elemento.attrib), 'caminho': caminho }
+            elif elemento.tag == 'DADOS-GERAIS':
+                entrada['nome'] = elemento.get('NOME-COMPLETO', '')
+                break
+    if entrada is None:
+        raise ValueError('empty curriculum')
+    return entrada
+
+class Indice(object):
+    """Índice id Lattes -> arquivo mais recente, entre cópias repetidas ou desatualizadas.
+    Com um manifesto (veja Manifest.py), só os arquivos novos ou alterados são lidos."""
+    def __init__(self, caminhos, manifest = None):
+        self.__entradas = OrderedDict()
+        self.__descartados = [] # (caminho, motivo)
+        self.__erros = [] # (caminho, mensagem)
+
+        # Entre cópias de mesma data, fica a primeira, na ordem dos caminhos
+        for caminho in caminhos:
+            try:
+                entrada = None if manifest is None else manifest.consulta_cabecalho(caminho)
+                if entrada is None:
+                    entrada = cabecalho(caminho)
+                    if manifest is not None:
+                        manifest.atualiza_cabecalho(caminho, entrada)
+            except ERROS_DE_LEITURA as e:
+                self.__erros.append( (caminho, str(e)) )
+                continue
+            atual = self.__entradas.get(entrada['id'])
+            if atual is None:
+                self.__entradas[entrada['id']] = entrada
+            elif entrada['atualizacao'] > atual['atualizacao']:
+                self.__descartados.append( (atual['caminho'], 'stale') )
+                self.__entradas[entrada['id']] = entrada
+            else:
+                self.__descartados.append( (caminho, 'duplicate' if entrada['atualizacao'] == atual['atualizacao'] else 'stale') )
+
+    def get_entradas(self):
+        return self.__entradas.values()
+
+    def get_caminhos(self):
+        """Os arquivos a pontuar, um por currículo, na ordem em que foram encontrados"""
+        return [ entrada['caminho'] for entrada in self.__entradas.values() ]
+
+    def get_descartados(self):
+        return list(self.__descartados)
+
+    def get_erros(self):
+        return list(self.__erros)
+
+# Indexa diretórios de currículos e lista o arquivo mais recente de cada um.
+if __name__ == "__main__":
+    import sys, time, json, argparse
+
+    parser = argparse.ArgumentParser(description="Indexes Lattes curricula by reading only their headers.")
+    parser.add_argument('diretorios', metavar='DIR', nargs='+',
+        help="directories (or files) of XML or ZIP curricula")
+    parser.add_argument('-o', '--output', dest='output', metavar='FILE',
+        help="write the index as JSON to FILE instead of one 'id,updated,path,name' line per curriculum")
+    parser.add_argument('-v', '--verbose', action='count',
+        help="list skipped files and timing")
+    args = parser.parse_args()
+
+    inicio = time.time()
+    caminhos = []
+    for diretorio in args.diretorios:
+        caminhos += curriculos(diretorio)
+    indice = Indice(caminhos)
+    duracao = time.time() - inicio
+
+    if args.output is not None:
+        with open(args.output, 'wb') as arquivo:
+            json.dump(indice.get_entradas(), arquivo, indent=1)
+    else:
+        for entrada in indice.get_entradas():
+            print ('%(id)s,%(atualizacao)s,%(caminho)s,%(nome)s' % entrada).encode('utf-8')
+    for caminho, mensagem in indice.get_erros():
+        print >> sys.stderr, caminho + ': ' + mensagem
+    if args.verbose == 1:
+        for caminho, motivo in indice.get_descartados():
+            print >> sys.stderr, caminho + ': ' + motivo
+        print >> sys.stderr, '%d files, %d curricula, %d skipped in %.3f s' % (len(caminhos), len(indice.get_entradas()),
+            len(indice.get_descartados()), duracao)
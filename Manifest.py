@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of the scoreLattes script.
+#
+# Copyright (C) 2017 Vicente Helano
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import os, json, fcntl, hashlib
+
+def hash_arquivo(caminho):
+    sha1 = hashlib.sha1()
+    with open(caminho, 'rb') as arquivo:
+        for bloco in iter(lambda: arquivo.read(1 << 16), ''):
+            sha1.update(bloco)
+    return sha1.hexdigest()
+
+# Assinatura de quaisquer parâmetros serializáveis em JSON (argumentos, pesos, limites, ...)
+def assinatura(*partes):
+    return hashlib.sha1( json.dumps(partes, sort_keys=True) ).hexdigest()
+
+class Trava(object):
+    """Trava exclusiva (flock) do manifesto, num arquivo ao lado dele, pois salva troca o próprio manifesto"""
+    def __init__(self, caminho):
+        self.__caminho = caminho + '.lock'
+
+    def __enter__(self):
+        self.__arquivo = open(self.__caminho, 'a')
+        fcntl.flock(self.__arquivo, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *excecao):
+        fcntl.flock(self.__arquivo, fcntl.LOCK_UN)
+        self.__arquivo.close()
+
+class Manifest(object):
+    """Manifesto (caminho, tamanho, mtime, hash do conteúdo) -> resultado da pontuação,
+    e (caminho, tamanho, mtime) -> cabeçalho do currículo (veja Index.py)"""
+    VERSAO = 5
+
+    def __init__(self, caminho, parametros):
+        self.__caminho = caminho
+        self.__parametros = parametros
+        self.__alterados = set() # caminhos atualizados por este processo
+        self.__mantidos = None # caminhos a manter (veja mantem)
+        self.__cabecalhos_alterados = set()
+        self.__indexados = set() # caminhos cujo cabeçalho foi consultado
+        self.__stats = {} # um só stat por arquivo nesta execução
+        self.__origem, self.__entradas, self.__cabecalhos = self.__carrega()
+
+    # Um manifesto gerado com outros parâmetros ou tabelas é descartado por
+    # inteiro. Retorna também a (versão, parâmetros) do arquivo, ou None.
+    def __carrega(self):
+        if not os.path.exists(self.__caminho):
+            return None, {}, {}
+        with open(self.__caminho, 'rb') as arquivo:
+            dados = json.load(arquivo)
+        origem = (dados.get('versao'), dados.get('parametros'))
+        if origem == (self.VERSAO, self.__parametros):
+            return origem, dados['entradas'], dados['cabecalhos']
+        return origem, {}, {}
+
+    def __stat(self, caminho):
+        st = self.__stats.get(caminho)
+        if st is None:
+            st = self.__stats[caminho] = os.stat(caminho)
+        return st
+
+    # Retorna (resultado, stat); o resultado é None se o arquivo é novo ou mudou.
+    # Arquivos com mesmo tamanho e mtime custam apenas um stat; o conteúdo só é
+    # lido quando o mtime mudou mas o tamanho não (e.g., uma cópia idêntica).
+    # Um arquivo inacessível fica para a pontuação, que relata o erro.
+    def consulta(self, caminho):
+        try:
+            st = self.__stat(caminho)
+        except OSError:
+            return None, None
+        entrada = self.__entradas.get(caminho)
+        if entrada is None or entrada['tamanho'] != st.st_size:
+            return None, st
+        if entrada['mtime'] == st.st_mtime:
+            return entrada['resultado'], st
+        if entrada['hash'] == hash_arquivo(caminho):
+            entrada['mtime'] = st.st_mtime
+            self.__alterados.add(caminho)
+            return entrada['resultado'], st
+        return None, st
+
+    def atualiza(self, caminho, resultado, st = None):
+        if st is None:
+            st = os.stat(caminho)
+        self.__entradas[caminho] = {
+            'tamanho': st.st_size,
+            'mtime': st.st_mtime,
+            'hash': hash_arquivo(caminho),
+            'resultado': resultado,
+        }
+        self.__alterados.add(caminho)
+
+    # O cabeçalho guardado de um arquivo com o mesmo tamanho e mtime, ou None.
+    # Com o stat compartilhado com consulta, um arquivo inalterado custa um só
+    # stat também com --latest. O stat de um arquivo inacessível levanta OSError.
+    def consulta_cabecalho(self, caminho):
+        st = self.__stat(caminho)
+        self.__indexados.add(caminho)
+        entrada = self.__cabecalhos.get(caminho)
+        if entrada is None or entrada['tamanho'] != st.st_size or entrada['mtime'] != st.st_mtime:
+            return None
+        return entrada['cabecalho']
+
+    def atualiza_cabecalho(self, caminho, cabecalho):
+        st = self.__stat(caminho)
+        self.__indexados.add(caminho)
+        self.__cabecalhos[caminho] = { 'tamanho': st.st_size, 'mtime': st.st_mtime, 'cabecalho': cabecalho }
+        self.__cabecalhos_alterados.add(caminho)
+
+    # Esquece os arquivos que não existem mais no diretório
+    def mantem(self, caminhos):
+        self.__mantidos = set(caminhos)
+        for caminho in self.__entradas.keys():
+            if caminho not in self.__mantidos:
+                del self.__entradas[caminho]
+
+    # Outros processos (um --refresh concorrente, a conclusão em segundo plano
+    # de resultados provisórios) podem ter gravado o manifesto desde que foi
+    # lido: sob a trava, as entradas deste processo são aplicadas sobre as do
+    # arquivo atual, em vez de substituí-lo. Os cabeçalhos são mantidos para
+    # todos os arquivos indexados, não só os pontuados, e só uma execução que
+    # indexou o diretório esquece os demais. Se, desde que foi lido, o arquivo
+    # passou a ser de outros parâmetros (uma execução mais nova, e.g. de
+    # outro período, enquanto este processo completava resultados em segundo
+    # plano), as entradas deste processo são descartadas e retorna False.
+    # Gravadas, as alterações deixam de ser deste processo: o manifesto pode
+    # continuar em uso (e.g., pela conclusão em segundo plano) e ser salvo de novo.
+    def salva(self):
+        with Trava(self.__caminho):
+            origem, entradas, cabecalhos = self.__carrega()
+            if origem != self.__origem and origem != (self.VERSAO, self.__parametros):
+                return False
+            for caminho in self.__alterados:
+                entradas[caminho] = self.__entradas[caminho]
+            for caminho in self.__cabecalhos_alterados:
+                cabecalhos[caminho] = self.__cabecalhos[caminho]
+            if self.__mantidos is not None:
+                for caminho in entradas.keys():
+                    if caminho not in self.__mantidos:
+                        del entradas[caminho]
+            if self.__indexados:
+                for caminho in cabecalhos.keys():
+                    if caminho not in self.__indexados:
+                        del cabecalhos[caminho]
+            temporario = self.__caminho + '.tmp'
+            with open(temporario, 'wb') as arquivo:
+                json.dump({'versao': self.VERSAO, 'parametros': self.__parametros, 'entradas': entradas,
+                    'cabecalhos': cabecalhos}, arquivo)
+            os.rename(temporario, self.__caminho)
+            self.__entradas = entradas
+            self.__cabecalhos = cabecalhos
+            self.__origem = (self.VERSAO, self.__parametros)
+            self.__alterados = set()
+            self.__cabecalhos_alterados = set()
+            self.__mantidos = None
+            self.__indexados = set()
+        return True
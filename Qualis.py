@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of the scoreLattes script.
+#
+# Copyright (C) 2017 Vicente Helano
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import csv, bisect, json, mmap, struct
+from array import array
+from unidecode import unidecode
+
+# Estratos em ordem decrescente de qualidade; o código de um estrato é a sua
+# posição nesta lista, de modo que min() sobre códigos escolhe o melhor estrato.
+ESTRATOS = ['A1', 'A2', 'B1', 'B2', 'B3', 'B4', 'B5', 'C']
+CODIGOS_ESTRATOS = dict( (estrato, codigo) for codigo, estrato in enumerate(ESTRATOS) )
+
+def arquivo_qualis(ano):
+    return 'qualis-periodicos-'+str(ano)+'.csv'
+
+def formata_area(area):
+    area = area.strip().upper()
+    area = unidecode( area.decode("utf-8") )
+    area = area.replace('/', '')
+    area = area.replace(',', '')
+    area = area.replace('  ', ' ') # remove duplicate spaces
+    area = area.replace(' ', '_')
+    return area.replace('Ç', 'C')
+
+def formata_titulo(titulo):
+    titulo = unidecode( titulo.decode("utf-8") ).split('(')[0]
+    return titulo.strip().upper()
+
+# ISSN '1234-567X' (com ou sem hífen) -> 1234567 * 11 + 10.
+# Retorna None para ISSNs vazios ou mal formados.
+def issn_para_inteiro(issn):
+    issn = issn.replace('-', '').strip().upper()
+    if len(issn) != 8 or not issn[:7].isdigit():
+        return None
+    if issn[7] == 'X':
+        verificador = 10
+    elif issn[7].isdigit():
+        verificador = int(issn[7])
+    else:
+        return None
+    return int(issn[:7]) * 11 + verificador
+
+# Arquivo exportado por QualisPeriodicos.exporta: assinatura, tamanho do cabeçalho
+# JSON (edições, áreas e blocos) e, em seguida, registros de largura fixa.
+ASSINATURA = 'QUALIS1\n'
+REGISTRO_ISSN = struct.Struct('<IB')     # ISSN, estrato
+REGISTRO_TITULO = struct.Struct('<IHI')  # posição do título no texto, tamanho, ISSN
+
+class _Campo(object):
+    """Um campo de registros de largura fixa no mapa, visto como sequência"""
+    def __init__(self, mapa, inicio, quantidade, registro, campo):
+        self.__mapa = mapa
+        self.__inicio = inicio
+        self.__quantidade = quantidade
+        self.__registro = registro
+        self.__campo = campo
+
+    def __len__(self):
+        return self.__quantidade
+
+    def __getitem__(self, i):
+        return self.__registro.unpack_from(self.__mapa, self.__inicio + i * self.__registro.size)[self.__campo]
+
+class _Textos(object):
+    """Os títulos referenciados pelos registros de títulos, vistos como sequência"""
+    def __init__(self, mapa, inicio, quantidade, texto):
+        self.__mapa = mapa
+        self.__inicio = inicio
+        self.__quantidade = quantidade
+        self.__texto = texto
+
+    def __len__(self):
+        return self.__quantidade
+
+    def __getitem__(self, i):
+        posicao, tamanho, issn = REGISTRO_TITULO.unpack_from(self.__mapa, self.__inicio + i * REGISTRO_TITULO.size)
+        return self.__mapa[self.__texto + posicao : self.__texto + posicao + tamanho]
+
+class QualisPeriodicos(object):
+    """Qualis Periódicos de várias edições e áreas em vetores ordenados"""
+    def __init__(self, edicoes, areas = None):
+        self.__edicoes = sorted(set(edicoes))
+        self.__codigos_areas = {}
+
+        # Cada bloco (código da edição, código da área) ocupa o intervalo
+        # [início, fim) dos vetores, que estão ordenados dentro do bloco.
+        self.__blocos = {}
+        self.__issns = array('I')
+        self.__estratos = array('B')
+        self.__blocos_titulos = {}
+        self.__titulos = []
+        self.__titulos_issns = array('I')
+
+        # Um ISSN repetido num mesmo bloco (edição, área) com estratos diferentes
+        # fica com o estrato da última linha do CSV, como numa tabela dict.
+        registros = {}
+        titulos = []
+        for edicao, ano in enumerate(self.__edicoes):
+            with open(arquivo_qualis(ano), 'rb') as csvfile:
+                reader = csv.reader(csvfile, delimiter=',', quotechar='"')
+                next(reader) # skip headers
+
+                for row in reader:
+                    area = formata_area(row[2])
+                    if areas is not None and area not in areas:
+                        continue
+                    issn = issn_para_inteiro(row[0])
+                    if issn is None or row[3] not in CODIGOS_ESTRATOS:
+                        continue
+                    if area not in self.__codigos_areas:
+                        self.__codigos_areas[area] = len(self.__codigos_areas)
+                    codigo_area = self.__codigos_areas[area]
+
+                    registros[(edicao, codigo_area, issn)] = CODIGOS_ESTRATOS[row[3]]
+                    titulos.append( (edicao, codigo_area, intern(formata_titulo(row[1])), issn) )
+
+        registros = [ chave + (estrato,) for chave, estrato in registros.items() ]
+        self.__indexa(registros, self.__blocos, self.__issns, self.__estratos)
+        self.__indexa(titulos, self.__blocos_titulos, self.__titulos, self.__titulos_issns)
+
+    def __indexa(self, registros, blocos, chaves, valores):
+        registros.sort()
+        bloco = None
+        for edicao, area, chave, valor in registros:
+            if (edicao, area) != bloco:
+                bloco = (edicao, area)
+                inicio = len(chaves)
+            elif chaves[-1] == chave and valores[-1] == valor:
+                continue # registro duplicado (títulos com o mesmo ISSN)
+            chaves.append(chave)
+            valores.append(valor)
+            blocos[bloco] = (inicio, len(chaves))
+
+    # A edição em vigor no ano do artigo é a mais recente que não lhe é posterior.
+    # Artigos anteriores a todas as edições carregadas usam a mais antiga.
+    def __bloco(self, blocos, area, ano):
+        if area not in self.__codigos_areas:
+            return None
+        edicao = max(bisect.bisect_right(self.__edicoes, ano) - 1, 0)
+        return blocos.get( (edicao, self.__codigos_areas[area]) )
+
+    def __procura(self, bloco, issn):
+        inicio, fim = bloco
+        i = bisect.bisect_left(self.__issns, issn, inicio, fim)
+        if i < fim and self.__issns[i] == issn:
+            return self.__estratos[i]
+        return None
+
+    def exporta(self, caminho):
+        """Grava a tabela num arquivo que outros processos mapeiam com QualisPeriodicos.anexa"""
+        textos = {}
+        texto = []
+        posicao = 0
+        for titulo in self.__titulos:
+            if titulo not in textos:
+                textos[titulo] = posicao
+                texto.append(titulo)
+                posicao += len(titulo)
+
+        cabecalho = json.dumps({
+            'edicoes': self.__edicoes,
+            'areas': self.__codigos_areas,
+            'blocos': [ list(bloco) + list(intervalo) for bloco, intervalo in self.__blocos.items() ],
+            'blocos_titulos': [ list(bloco) + list(intervalo) for bloco, intervalo in self.__blocos_titulos.items() ],
+            'issns': len(self.__issns),
+            'titulos': len(self.__titulos),
+        })
+        with open(caminho, 'wb') as arquivo:
+            arquivo.write(ASSINATURA + struct.pack('<I', len(cabecalho)) + cabecalho)
+            for issn, estrato in zip(self.__issns, self.__estratos):
+                arquivo.write(REGISTRO_ISSN.pack(issn, estrato))
+            for titulo, issn in zip(self.__titulos, self.__titulos_issns):
+                arquivo.write(REGISTRO_TITULO.pack(textos[titulo], len(titulo), issn))
+            arquivo.write(''.join(texto))
+
+    @classmethod
+    def anexa(cls, caminho):
+        """Mapeia, somente para leitura e sem cópia, uma tabela gravada por exporta"""
+        with open(caminho, 'rb') as arquivo:
+            mapa = mmap.mmap(arquivo.fileno(), 0, access=mmap.ACCESS_READ)
+        if mapa[:len(ASSINATURA)] != ASSINATURA:
+            raise ValueError(caminho + ': not a Qualis Periodicos table')
+        tamanho, = struct.unpack_from('<I', mapa, len(ASSINATURA))
+        inicio = len(ASSINATURA) + 4
+        cabecalho = json.loads(mapa[inicio : inicio + tamanho])
+        inicio += tamanho
+
+        qualis = cls.__new__(cls)
+        qualis.__edicoes = cabecalho['edicoes']
+        qualis.__codigos_areas = dict( (area.encode('utf-8'), codigo) for area, codigo in cabecalho['areas'].items() )
+        qualis.__blocos = dict( ((e, a), (i, f)) for e, a, i, f in cabecalho['blocos'] )
+        qualis.__blocos_titulos = dict( ((e, a), (i, f)) for e, a, i, f in cabecalho['blocos_titulos'] )
+
+        n = cabecalho['issns']
+        qualis.__issns = _Campo(mapa, inicio, n, REGISTRO_ISSN, 0)
+        qualis.__estratos = _Campo(mapa, inicio, n, REGISTRO_ISSN, 1)
+        inicio += n * REGISTRO_ISSN.size
+
+        n = cabecalho['titulos']
+        texto = inicio + n * REGISTRO_TITULO.size
+        qualis.__titulos = _Textos(mapa, inicio, n, texto)
+        qualis.__titulos_issns = _Campo(mapa, inicio, n, REGISTRO_TITULO, 2)
+        return qualis
+
+    def get_edicoes(self):
+        return list(self.__edicoes)
+
+    def estrato(self, issn, area, ano):
+        issn = issn_para_inteiro(issn)
+        bloco = self.__bloco(self.__blocos, area, ano)
+        if issn is None or bloco is None:
+            return 'NAO-ENCONTRADO'
+
+        codigo = self.__procura(bloco, issn)
+        if codigo is None:
+            return 'NAO-ENCONTRADO'
+        return ESTRATOS[codigo]
+
+    def estrato_por_titulo(self, titulo, area, ano):
+        bloco = self.__bloco(self.__blocos, area, ano)
+        bloco_titulos = self.__bloco(self.__blocos_titulos, area, ano)
+        if bloco is None or bloco_titulos is None:
+            return 'NAO-ENCONTRADO'
+
+        # Um mesmo título pode ter vários ISSNs (impresso e eletrônico)
+        codigos = [len(ESTRATOS)]
+        inicio, fim = bloco_titulos
+        i = bisect.bisect_left(self.__titulos, titulo, inicio, fim)
+        while i < fim and self.__titulos[i] == titulo:
+            codigo = self.__procura(bloco, self.__titulos_issns[i])
+            if codigo is not None:
+                codigos.append(codigo)
+            i += 1
+
+        codigo = min(codigos)
+        if codigo == len(ESTRATOS):
+            return 'NAO-ENCONTRADO'
+        return ESTRATOS[codigo]
@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of the scoreLattes script.
+#
+# Copyright (C) 2017 Vicente Helano
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import time, random, ctypes, hashlib, urlparse, multiprocessing, requests
+from email.utils import parsedate_tz, mktime_tz
+
+# Erros que valem uma nova tentativa; qualquer outro status diferente de 200 é definitivo.
+TRANSITORIOS = set([408, 425, 429, 500, 502, 503, 504])
+REDIRECIONAMENTOS = set([301, 302, 303, 307, 308])
+
+def retry_after(r):
+    valor = r.headers.get('Retry-After')
+    if valor is None:
+        return None
+    if valor.strip().isdigit():
+        return float(valor)
+    data = parsedate_tz(valor)
+    if data is None:
+        return None
+    return max(mktime_tz(data) - time.time(), 0.0)
+
+class PrazoEsgotado(Exception):
+    """O prazo terminou antes que se soubesse se a URL pode ser obtida"""
+    pass
+
+class HostBloqueado(PrazoEsgotado):
+    """O host pediu (Retry-After) uma espera maior que o teto: tampouco se sabe se a URL pode ser obtida"""
+    pass
+
+class Scheduler(object):
+    """Requisições HTTP com limite de taxa por host, backoff e limite global de conexões"""
+    def __init__(self, taxa = 2.0, rajada = 4, conexoes = 8, tentativas = 6, base = 0.5, teto = 30.0, timeout = 3, hosts = 1024):
+        self.__taxa = float(taxa)        # requisições por segundo, por host
+        self.__rajada = float(rajada)    # capacidade do balde de fichas de cada host
+        self.__tentativas = tentativas
+        self.__base = base
+        self.__teto = teto               # maior espera aceita, seja de backoff ou de Retry-After
+        self.__timeout = timeout
+
+        # Estado compartilhado por todos os processos criados depois do Scheduler.
+        # Cada host ocupa uma posição dos vetores, identificada pela chave do
+        # host (veja __posicao), de modo que o balde e o bloqueio de um host
+        # não valem para outro.
+        self.__trava = multiprocessing.Lock()
+        self.__conexoes = multiprocessing.BoundedSemaphore(conexoes)
+        self.__chaves = multiprocessing.RawArray(ctypes.c_uint64, hosts) # 0: posição livre
+        self.__fichas = multiprocessing.RawArray('d', [self.__rajada] * hosts)
+        self.__atualizacao = multiprocessing.RawArray('d', hosts)
+        self.__bloqueio = multiprocessing.RawArray('d', hosts) # host bloqueado até este instante
+
+    # A posição do host, sob a trava: endereçamento aberto por uma chave de 64
+    # bits do nome do host, procurando a partir da posição de hash até achar a
+    # própria chave ou uma posição livre. Só com todas as posições ocupadas por
+    # outros hosts um host novo divide a posição de hash.
+    def __posicao(self, url):
+        netloc = urlparse.urlsplit(url).netloc.lower()
+        chave = int(hashlib.sha1(netloc).hexdigest()[:16], 16) | 1
+        n = len(self.__chaves)
+        inicio = chave % n
+        for i in range(n):
+            posicao = (inicio + i) % n
+            if self.__chaves[posicao] == 0:
+                self.__chaves[posicao] = chave
+            if self.__chaves[posicao] == chave:
+                return posicao
+        return inicio
+
+    # Espera até haver uma ficha para o host. Levanta HostBloqueado se o host
+    # está bloqueado (Retry-After) por mais tempo do que o teto, e
+    # PrazoEsgotado se a espera terminaria depois do prazo.
+    def __aguarda(self, host, url, prazo):
+        while True:
+            with self.__trava:
+                agora = time.time()
+                fichas = min(self.__rajada, self.__fichas[host] + (agora - self.__atualizacao[host]) * self.__taxa)
+                self.__atualizacao[host] = agora
+                self.__fichas[host] = fichas
+
+                espera = self.__bloqueio[host] - agora
+                if espera > self.__teto:
+                    raise HostBloqueado(url)
+                if espera <= 0:
+                    if fichas >= 1:
+                        self.__fichas[host] = fichas - 1
+                        return True
+                    espera = (1 - fichas) / self.__taxa
+                if prazo is not None and agora + espera > prazo:
+                    raise PrazoEsgotado(url)
+            time.sleep(espera)
+
+    def __bloqueia(self, host, segundos):
+        with self.__trava:
+            self.__bloqueio[host] = max(self.__bloqueio[host], time.time() + segundos)
+
+    def get(self, url, prazo = None):
+        """Retorna a resposta com status 200, ou None se a URL não pôde ser obtida.
+        Com um prazo (um instante de time.time()), nenhuma espera vai além dele:
+        se a resposta ainda não é conhecida quando o prazo chega, levanta PrazoEsgotado.
+        Se o host pede uma espera maior que o teto, levanta HostBloqueado."""
+        tentativa = 0
+        redirecionamentos = 0
+        while tentativa < self.__tentativas:
+            with self.__trava:
+                host = self.__posicao(url)
+            self.__aguarda(host, url, prazo)
+
+            r = None
+            if prazo is None:
+                self.__conexoes.acquire()
+            elif not self.__conexoes.acquire(True, max(prazo - time.time(), 0)):
+                raise PrazoEsgotado(url)
+            try:
+                timeout = self.__timeout
+                if prazo is not None:
+                    timeout = min(timeout, prazo - time.time())
+                    if timeout <= 0:
+                        raise PrazoEsgotado(url)
+                r = requests.get(url, timeout=timeout, allow_redirects=False)
+            except requests.exceptions.RequestException:
+                pass
+            finally:
+                self.__conexoes.release()
+
+            # Redirecionamentos são seguidos aqui, para que cada host tenha sua taxa (dx.doi.org -> editora)
+            if r is not None and r.status_code in REDIRECIONAMENTOS and 'Location' in r.headers and redirecionamentos < 10:
+                url = urlparse.urljoin(url, r.headers['Location'])
+                redirecionamentos += 1
+                continue
+            if r is not None and r.status_code == 200:
+                return r
+            if r is not None and r.status_code not in TRANSITORIOS:
+                return None
+
+            # Backoff exponencial com jitter completo; 429 e 503 bloqueiam o host
+            # para todos os processos, pelo Retry-After se houver.
+            tentativa += 1
+            espera = random.uniform(0, min(self.__teto, self.__base * 2 ** tentativa))
+            if r is not None and r.status_code in (429, 503):
+                pedido = retry_after(r)
+                if pedido is not None:
+                    if pedido > self.__teto:
+                        self.__bloqueia(host, pedido)
+                        raise HostBloqueado(url)
+                    espera = max(espera, pedido)
+                self.__bloqueia(host, espera)
+            if tentativa < self.__tentativas:
+                if prazo is not None and time.time() + espera > prazo:
+                    raise PrazoEsgotado(url)
+                time.sleep(espera)
+        return None
+
+# Verificação contra um servidor local que simula os comportamentos de editoras.
+if __name__ == "__main__":
+    import threading, BaseHTTPServer, SocketServer
+
+    class Editora(BaseHTTPServer.BaseHTTPRequestHandler):
+        contagem = {}
+
+        def do_GET(self):
+            n = Editora.contagem[self.path] = Editora.contagem.get(self.path, 0) + 1
+            if self.path == '/ok':
+                self.responde(200)
+            elif self.path == '/ausente':
+                self.responde(404)
+            elif self.path == '/redireciona':
+                self.responde(302, {'Location': '/ok'})
+            elif self.path == '/limite' and n == 1:
+                self.responde(429, {'Retry-After': '1'})
+            elif self.path == '/instavel' and n <= 2:
+                self.responde(503)
+            elif self.path in ('/limite', '/instavel'):
+                self.responde(200)
+            elif self.path == '/bloqueado':
+                self.responde(429, {'Retry-After': '3600'})
+            elif self.path == '/lento':
+                time.sleep(2)
+                self.responde(200)
+
+        def responde(self, status, cabecalhos = {}):
+            self.send_response(status)
+            for chave, valor in cabecalhos.items():
+                self.send_header(chave, valor)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    class Servidor(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+        daemon_threads = True
+
+        def handle_error(self, request, client_address):
+            pass # clientes que desistiram pelo prazo
+
+    servidor = Servidor(('127.0.0.1', 0), Editora)
+    thread = threading.Thread(target=servidor.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    local = 'http://127.0.0.1:%d' % servidor.server_port
+    scheduler = Scheduler(taxa = 20, rajada = 20, base = 0.1)
+    for caminho, esperado in [('/ok', 200), ('/ausente', None), ('/redireciona', 200), ('/limite', 200), ('/instavel', 200), ('/bloqueado', 'blocked')]:
+        inicio = time.time()
+        try:
+            r = scheduler.get(local + caminho)
+            status = None if r is None else r.status_code
+        except HostBloqueado:
+            status = 'blocked'
+        print '%-12s %-5s %d request(s) %.2fs %s' % (caminho, status, Editora.contagem.get(caminho, 0), time.time() - inicio, 'ok' if status == esperado else 'FAIL')
+
+    # Numa tabela de 2 posições, dois hosts ficam em posições distintas, tenham
+    # ou não a mesma posição de hash: o bloqueio de localhost não vale para
+    # 127.0.0.1, mas continua valendo para localhost
+    scheduler = Scheduler(taxa = 20, rajada = 20, base = 0.1, hosts = 2)
+    outro = 'http://localhost:%d' % servidor.server_port
+    for url, esperado in [(outro + '/bloqueado', 'blocked'), (local + '/ok', 200), (outro + '/ok', 'blocked')]:
+        try:
+            r = scheduler.get(url)
+            status = None if r is None else r.status_code
+        except HostBloqueado:
+            status = 'blocked'
+        print '%-12s %-7s %s' % (urlparse.urlsplit(url).netloc.split(':')[0], status, 'ok' if status == esperado else 'FAIL')
+
+    # Com prazo de 0.5s: a resposta lenta e o Retry-After de 1s não cabem no prazo
+    scheduler = Scheduler(taxa = 20, rajada = 20, base = 0.1)
+    for caminho in ['/lento', '/limite']:
+        Editora.contagem.clear()
+        inicio = time.time()
+        try:
+            scheduler.get(local + caminho, time.time() + 0.5)
+            resultado = 'FAIL'
+        except PrazoEsgotado:
+            resultado = 'ok' if time.time() - inicio < 0.7 else 'FAIL'
+        print '%-12s %-5s %d request(s) %.2fs %s' % (caminho, 'late', Editora.contagem.get(caminho, 0), time.time() - inicio, resultado)
+
+    # Taxa por host: 10 requisições a 5/s com rajada 1 levam cerca de 1.8s
+    scheduler = Scheduler(taxa = 5, rajada = 1)
+    inicio = time.time()
+    for i in range(10):
+        scheduler.get(local + '/ok')
+    print 'rate limit   10 requests at 5/s in %.2fs' % (time.time() - inicio)
+    servidor.shutdown()
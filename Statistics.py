@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of the scoreLattes script.
+#
+# Copyright (C) 2017 Vicente Helano
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import sys, math, bisect, json, argparse
+from collections import OrderedDict
+
+# Limites das faixas dos histogramas (série 1-2-5), comuns a todos os campos
+LIMITES = [0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000]
+
+class Quantis(object):
+    """Esboço de quantis com erro relativo alfa, de memória limitada e mesclagem exata"""
+    def __init__(self, alfa = 0.01):
+        self.__alfa = alfa
+        self.__gama = (1 + alfa) / (1 - alfa)
+        self.__log_gama = math.log(self.__gama)
+        self.__zeros = 0
+        self.__baldes = {} # índice i conta os valores em (gama^(i-1), gama^i]
+
+    def adiciona(self, x):
+        if x <= 0: # as pontuações nunca são negativas
+            self.__zeros += 1
+            return
+        i = int(math.ceil(math.log(x) / self.__log_gama))
+        self.__baldes[i] = self.__baldes.get(i, 0) + 1
+
+    def mescla(self, outro):
+        if outro.__alfa != self.__alfa:
+            raise ValueError('cannot merge sketches with different accuracy')
+        self.__zeros += outro.__zeros
+        for i, n in outro.__baldes.items():
+            self.__baldes[i] = self.__baldes.get(i, 0) + n
+
+    def contagem(self):
+        return self.__zeros + sum(self.__baldes.values())
+
+    def quantil(self, q):
+        total = self.contagem()
+        if total == 0:
+            return None
+        posicao = int(q * (total - 1))
+        acumulado = self.__zeros
+        if posicao < acumulado:
+            return 0.0
+        for i in sorted(self.__baldes):
+            acumulado += self.__baldes[i]
+            if posicao < acumulado:
+                return 2 * self.__gama ** i / (self.__gama + 1)
+
+    def para_dict(self):
+        return {'alfa': self.__alfa, 'zeros': self.__zeros, 'baldes': self.__baldes}
+
+    @classmethod
+    def de_dict(cls, dados):
+        quantis = cls(dados['alfa'])
+        quantis.__zeros = dados['zeros']
+        quantis.__baldes = dict( (int(i), n) for i, n in dados['baldes'].items() )
+        return quantis
+
+class Histograma(object):
+    """Contagens em faixas fixas: (-inf, l0), [l0, l1), ..., [ln, inf)"""
+    def __init__(self, limites = LIMITES):
+        self.__limites = list(limites)
+        self.__contagens = [0] * (len(limites) + 1)
+
+    def adiciona(self, x):
+        self.__contagens[bisect.bisect_right(self.__limites, x)] += 1
+
+    def mescla(self, outro):
+        if outro.__limites != self.__limites:
+            raise ValueError('cannot merge histograms with different bins')
+        self.__contagens = [ a + b for a, b in zip(self.__contagens, outro.__contagens) ]
+
+    def get_contagens(self):
+        return list(self.__contagens)
+
+    def para_dict(self):
+        return {'limites': self.__limites, 'contagens': self.__contagens}
+
+    @classmethod
+    def de_dict(cls, dados):
+        histograma = cls(dados['limites'])
+        histograma.__contagens = list(dados['contagens'])
+        return histograma
+
+class Agregado(object):
+    """Estatísticas de um grupo de currículos, para cada campo numérico dos registros"""
+    def __init__(self, campos, alfa = 0.01, limites = LIMITES):
+        self.__contagem = 0
+        self.__somas = OrderedDict( (campo, 0) for campo in campos )
+        self.__minimos = {}
+        self.__maximos = {}
+        self.__quantis = dict( (campo, Quantis(alfa)) for campo in campos )
+        self.__histogramas = dict( (campo, Histograma(limites)) for campo in campos )
+
+    def adiciona(self, registro):
+        self.__contagem += 1
+        for campo in self.__somas:
+            x = registro[campo]
+            self.__somas[campo] += x
+            self.__minimos[campo] = min(self.__minimos.get(campo, x), x)
+            self.__maximos[campo] = max(self.__maximos.get(campo, x), x)
+            self.__quantis[campo].adiciona(x)
+            self.__histogramas[campo].adiciona(x)
+
+    def mescla(self, outro):
+        self.__contagem += outro.__contagem
+        for campo in self.__somas:
+            self.__somas[campo] += outro.__somas[campo]
+            for proprio, alheio, escolha in [(self.__minimos, outro.__minimos, min), (self.__maximos, outro.__maximos, max)]:
+                if campo in alheio:
+                    proprio[campo] = escolha(proprio.get(campo, alheio[campo]), alheio[campo])
+            self.__quantis[campo].mescla(outro.__quantis[campo])
+            self.__histogramas[campo].mescla(outro.__histogramas[campo])
+
+    def get_contagem(self):
+        return self.__contagem
+
+    def get_soma(self, campo):
+        return self.__somas[campo]
+
+    def get_media(self, campo):
+        return self.__somas[campo] / float(self.__contagem) if self.__contagem else None
+
+    def get_minimo(self, campo):
+        return self.__minimos.get(campo)
+
+    def get_maximo(self, campo):
+        return self.__maximos.get(campo)
+
+    # O esboço devolve o ponto médio de um balde, que pode cair fora dos
+    # valores observados; o quantil é limitado ao mínimo e ao máximo exatos.
+    def get_quantil(self, campo, q):
+        valor = self.__quantis[campo].quantil(q)
+        if valor is None:
+            return None
+        return min(max(valor, self.__minimos[campo]), self.__maximos[campo])
+
+    def get_histograma(self, campo):
+        return self.__histogramas[campo].get_contagens()
+
+    def para_dict(self):
+        return {
+            'contagem': self.__contagem,
+            'campos': [ { 'campo': campo, 'soma': self.__somas[campo], 'minimo': self.__minimos.get(campo),
+                'maximo': self.__maximos.get(campo), 'quantis': self.__quantis[campo].para_dict(),
+                'histograma': self.__histogramas[campo].para_dict() } for campo in self.__somas ],
+        }
+
+    @classmethod
+    def de_dict(cls, dados):
+        agregado = cls([ campo['campo'] for campo in dados['campos'] ])
+        agregado.__contagem = dados['contagem']
+        for campo in dados['campos']:
+            nome = campo['campo']
+            agregado.__somas[nome] = campo['soma']
+            if campo['minimo'] is not None:
+                agregado.__minimos[nome] = campo['minimo']
+                agregado.__maximos[nome] = campo['maximo']
+            agregado.__quantis[nome] = Quantis.de_dict(campo['quantis'])
+            agregado.__histogramas[nome] = Histograma.de_dict(campo['histograma'])
+        return agregado
+
+class Estatisticas(object):
+    """Agregados de todos os currículos, por área e por departamento, alimentados em fluxo"""
+    def __init__(self, campos, alfa = 0.01, limites = LIMITES):
+        self.__campos = list(campos)
+        self.__alfa = alfa
+        self.__limites = limites
+        self.__grupos = OrderedDict()
+
+    def __grupo(self, chave):
+        if chave not in self.__grupos:
+            self.__grupos[chave] = Agregado(self.__campos, self.__alfa, self.__limites)
+        return self.__grupos[chave]
+
+    def adiciona(self, registro):
+        for chave in [ ('TODOS', ''), ('AREA', registro['area']), ('DEPARTAMENTO', registro['departamento']) ]:
+            self.__grupo(chave).adiciona(registro)
+
+    def mescla(self, outro):
+        if outro.__campos != self.__campos:
+            raise ValueError('cannot merge statistics of different fields')
+        for chave, agregado in outro.__grupos.items():
+            self.__grupo(chave).mescla(agregado)
+
+    def get_grupos(self):
+        return self.__grupos.items()
+
+    def salva(self, caminho):
+        with open(caminho, 'wb') as arquivo:
+            json.dump({ 'campos': self.__campos, 'alfa': self.__alfa, 'limites': self.__limites,
+                'grupos': [ [tipo, nome, agregado.para_dict()] for (tipo, nome), agregado in self.__grupos.items() ] }, arquivo)
+
+    @classmethod
+    def carrega(cls, caminho):
+        with open(caminho, 'rb') as arquivo:
+            dados = json.load(arquivo)
+        estatisticas = cls(dados['campos'], dados['alfa'], dados['limites'])
+        for tipo, nome, agregado in dados['grupos']:
+            estatisticas.__grupos[(tipo, nome)] = Agregado.de_dict(agregado)
+        return estatisticas
+
+    def sumario(self, stream = sys.stdout):
+        for (tipo, nome), agregado in self.__grupos.items():
+            print >> stream, ('%s %s (%d curricula)' % (tipo, nome, agregado.get_contagem())).strip().encode('utf-8')
+            print >> stream, '%-37s %9s %9s %9s %9s %9s %9s' % ('', 'MEAN', 'P25', 'P50', 'P75', 'P90', 'MAX')
+            for campo in self.__campos:
+                if agregado.get_soma(campo) == 0:
+                    continue
+                valores = [agregado.get_media(campo)] + [ agregado.get_quantil(campo, q) for q in (0.25, 0.5, 0.75, 0.9) ] + [agregado.get_maximo(campo)]
+                print >> stream, '%-37s %9.2f %9.2f %9.2f %9.2f %9.2f %9.2f' % tuple([campo + ':'] + valores)
+            print >> stream, ''
+
+# Mescla estatísticas parciais (de vários lotes ou máquinas) e mostra o resumo.
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merges and summarizes statistics written by scoreLattes.py --stats.")
+    parser.add_argument('parciais', metavar='FILE', nargs='+',
+        help="partial statistics")
+    parser.add_argument('-o', '--output', dest='output', metavar='FILE',
+        help="write the merged statistics to FILE")
+    args = parser.parse_args()
+
+    estatisticas = Estatisticas.carrega(args.parciais[0])
+    for parcial in args.parciais[1:]:
+        estatisticas.mescla(Estatisticas.carrega(parcial))
+    if args.output is not None:
+        estatisticas.salva(args.output)
+    estatisticas.sumario()
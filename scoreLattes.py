@@ -21,30 +21,143 @@
 # Author(s): Vicente Helano <vicente.sobrinho@ufca.edu.br>
 #
 
-import sys, time, codecs, re, argparse, csv, requests
-import xml.etree.ElementTree as ET
+import os, sys, time, codecs, re, argparse, csv, json, itertools, multiprocessing, tempfile, traceback
 from bs4 import BeautifulSoup
 from unidecode import unidecode
 from datetime import date
+from collections import OrderedDict
 
 from Weights import weights
 from Bounds import bounds
+from Qualis import QualisPeriodicos, arquivo_qualis, formata_titulo
+from Manifest import Manifest, assinatura
+from Scheduler import Scheduler, PrazoEsgotado, HostBloqueado
+from Statistics import Estatisticas
+from Backend import BACKENDS, backend, extrai
+from Index import Indice, curriculos, abre, ERROS_DE_LEITURA
+
+# Leaves of the qualification table, in the same order as in Weights.py.
+CAMPOS = [
+    ('POS-DOUTORADO',                       ('FORMACAO-ACADEMICA-TITULACAO', 'POS-DOUTORADO')),
+    ('LIVRE-DOCENCIA',                      ('FORMACAO-ACADEMICA-TITULACAO', 'LIVRE-DOCENCIA')),
+    ('DOUTORADO',                           ('FORMACAO-ACADEMICA-TITULACAO', 'DOUTORADO')),
+    ('MESTRADO',                            ('FORMACAO-ACADEMICA-TITULACAO', 'MESTRADO')),
+    ('PROJETO-DE-PESQUISA',                 ('PROJETO-DE-PESQUISA', 'PESQUISA')),
+    ('PROJETO-DE-DESENVOLVIMENTO',          ('PROJETO-DE-PESQUISA', 'DESENVOLVIMENTO')),
+    ('ARTIGOS-PUBLICADOS-QUALIS-A1',        ('PRODUCAO-BIBLIOGRAFICA', 'ARTIGOS-PUBLICADOS', 'A1')),
+    ('ARTIGOS-PUBLICADOS-QUALIS-A2',        ('PRODUCAO-BIBLIOGRAFICA', 'ARTIGOS-PUBLICADOS', 'A2')),
+    ('ARTIGOS-PUBLICADOS-QUALIS-B1',        ('PRODUCAO-BIBLIOGRAFICA', 'ARTIGOS-PUBLICADOS', 'B1')),
+    ('ARTIGOS-PUBLICADOS-QUALIS-B2',        ('PRODUCAO-BIBLIOGRAFICA', 'ARTIGOS-PUBLICADOS', 'B2')),
+    ('ARTIGOS-PUBLICADOS-QUALIS-B3',        ('PRODUCAO-BIBLIOGRAFICA', 'ARTIGOS-PUBLICADOS', 'B3')),
+    ('ARTIGOS-PUBLICADOS-QUALIS-B4',        ('PRODUCAO-BIBLIOGRAFICA', 'ARTIGOS-PUBLICADOS', 'B4')),
+    ('ARTIGOS-PUBLICADOS-QUALIS-B5',        ('PRODUCAO-BIBLIOGRAFICA', 'ARTIGOS-PUBLICADOS', 'B5')),
+    ('ARTIGOS-PUBLICADOS-QUALIS-C',         ('PRODUCAO-BIBLIOGRAFICA', 'ARTIGOS-PUBLICADOS', 'C')),
+    ('ARTIGOS-PUBLICADOS-SEM-QUALIS',       ('PRODUCAO-BIBLIOGRAFICA', 'ARTIGOS-PUBLICADOS', 'NAO-ENCONTRADO')),
+    ('TRABALHOS-COMPLETOS-INTERNACIONAIS',  ('PRODUCAO-BIBLIOGRAFICA', 'TRABALHOS-EM-EVENTOS', 'INTERNACIONAL', 'COMPLETO')),
+    ('TRABALHOS-EXPANDIDOS-INTERNACIONAIS', ('PRODUCAO-BIBLIOGRAFICA', 'TRABALHOS-EM-EVENTOS', 'INTERNACIONAL', 'RESUMO_EXPANDIDO')),
+    ('TRABALHOS-RESUMOS-INTERNACIONAIS',    ('PRODUCAO-BIBLIOGRAFICA', 'TRABALHOS-EM-EVENTOS', 'INTERNACIONAL', 'RESUMO')),
+    ('TRABALHOS-COMPLETOS-NACIONAIS',       ('PRODUCAO-BIBLIOGRAFICA', 'TRABALHOS-EM-EVENTOS', 'NACIONAL', 'COMPLETO')),
+    ('TRABALHOS-EXPANDIDOS-NACIONAIS',      ('PRODUCAO-BIBLIOGRAFICA', 'TRABALHOS-EM-EVENTOS', 'NACIONAL', 'RESUMO_EXPANDIDO')),
+    ('TRABALHOS-RESUMOS-NACIONAIS',         ('PRODUCAO-BIBLIOGRAFICA', 'TRABALHOS-EM-EVENTOS', 'NACIONAL', 'RESUMO')),
+    ('TRABALHOS-COMPLETOS-REGIONAIS',       ('PRODUCAO-BIBLIOGRAFICA', 'TRABALHOS-EM-EVENTOS', 'REGIONAL', 'COMPLETO')),
+    ('TRABALHOS-EXPANDIDOS-REGIONAIS',      ('PRODUCAO-BIBLIOGRAFICA', 'TRABALHOS-EM-EVENTOS', 'REGIONAL', 'RESUMO_EXPANDIDO')),
+    ('TRABALHOS-RESUMOS-REGIONAIS',         ('PRODUCAO-BIBLIOGRAFICA', 'TRABALHOS-EM-EVENTOS', 'REGIONAL', 'RESUMO')),
+    ('TRABALHOS-COMPLETOS-LOCAIS',          ('PRODUCAO-BIBLIOGRAFICA', 'TRABALHOS-EM-EVENTOS', 'LOCAL', 'COMPLETO')),
+    ('TRABALHOS-EXPANDIDOS-LOCAIS',         ('PRODUCAO-BIBLIOGRAFICA', 'TRABALHOS-EM-EVENTOS', 'LOCAL', 'RESUMO_EXPANDIDO')),
+    ('TRABALHOS-RESUMOS-LOCAIS',            ('PRODUCAO-BIBLIOGRAFICA', 'TRABALHOS-EM-EVENTOS', 'LOCAL', 'RESUMO')),
+    ('TRABALHOS-COMPLETOS-NAO-INFORMADO',   ('PRODUCAO-BIBLIOGRAFICA', 'TRABALHOS-EM-EVENTOS', 'NAO_INFORMADO', 'COMPLETO')),
+    ('TRABALHOS-EXPANDIDOS-NAO-INFORMADO',  ('PRODUCAO-BIBLIOGRAFICA', 'TRABALHOS-EM-EVENTOS', 'NAO_INFORMADO', 'RESUMO_EXPANDIDO')),
+    ('TRABALHOS-RESUMOS-NAO-INFORMADO',     ('PRODUCAO-BIBLIOGRAFICA', 'TRABALHOS-EM-EVENTOS', 'NAO_INFORMADO', 'RESUMO')),
+    ('LIVROS-PUBLICADOS',                   ('PRODUCAO-BIBLIOGRAFICA', 'LIVROS-E-CAPITULOS', 'LIVRO-PUBLICADO-OU-ORGANIZADO', 'LIVRO_PUBLICADO')),
+    ('LIVROS-ORGANIZADOS',                  ('PRODUCAO-BIBLIOGRAFICA', 'LIVROS-E-CAPITULOS', 'LIVRO-PUBLICADO-OU-ORGANIZADO', 'LIVRO_ORGANIZADO_OU_EDICAO')),
+    ('LIVROS-NAO-INFORMADO',                ('PRODUCAO-BIBLIOGRAFICA', 'LIVROS-E-CAPITULOS', 'LIVRO-PUBLICADO-OU-ORGANIZADO', 'NAO_INFORMADO')),
+    ('CAPITULO-DE-LIVRO-PUBLICADO',         ('PRODUCAO-BIBLIOGRAFICA', 'LIVROS-E-CAPITULOS', 'CAPITULO-DE-LIVRO-PUBLICADO')),
+    ('TRADUCOES',                           ('PRODUCAO-BIBLIOGRAFICA', 'DEMAIS-TIPOS-DE-PRODUCAO-BIBLIOGRAFICA', 'TRADUCAO')),
+    ('SOFTWARES',                           ('PRODUCAO-TECNICA', 'SOFTWARE')),
+    ('PATENTES-DEPOSITADAS',                ('PRODUCAO-TECNICA', 'PATENTE', 'DEPOSITADA')),
+    ('PATENTES-CONCEDIDAS',                 ('PRODUCAO-TECNICA', 'PATENTE', 'CONCEDIDA')),
+    ('PRODUTOS-TECNOLOGICOS',               ('PRODUCAO-TECNICA', 'PRODUTO-TECNOLOGICO')),
+    ('PROCESSOS-OU-TECNICAS',               ('PRODUCAO-TECNICA', 'PROCESSOS-OU-TECNICAS')),
+    ('TRABALHOS-TECNICOS',                  ('PRODUCAO-TECNICA', 'TRABALHO-TECNICO')),
+    ('APRESENTACAO-DE-OBRA-ARTISTICA',      ('OUTRA-PRODUCAO', 'PRODUCAO-ARTISTICA-CULTURAL', 'APRESENTACAO-DE-OBRA-ARTISTICA')),
+    ('COMPOSICAO-MUSICAL',                  ('OUTRA-PRODUCAO', 'PRODUCAO-ARTISTICA-CULTURAL', 'COMPOSICAO-MUSICAL')),
+    ('OBRA-DE-ARTES-VISUAIS',               ('OUTRA-PRODUCAO', 'PRODUCAO-ARTISTICA-CULTURAL', 'OBRA-DE-ARTES-VISUAIS')),
+    ('ORIENTACOES-PARA-POS-DOUTORADO',      ('OUTRA-PRODUCAO', 'ORIENTACOES-CONCLUIDAS', 'ORIENTACOES-CONCLUIDAS-PARA-POS-DOUTORADO')),
+    ('ORIENTACOES-PARA-DOUTORADO',          ('OUTRA-PRODUCAO', 'ORIENTACOES-CONCLUIDAS', 'ORIENTACOES-CONCLUIDAS-PARA-DOUTORADO', 'ORIENTADOR_PRINCIPAL')),
+    ('CO-ORIENTACOES-PARA-DOUTORADO',       ('OUTRA-PRODUCAO', 'ORIENTACOES-CONCLUIDAS', 'ORIENTACOES-CONCLUIDAS-PARA-DOUTORADO', 'CO_ORIENTADOR')),
+    ('ORIENTACOES-PARA-MESTRADO',           ('OUTRA-PRODUCAO', 'ORIENTACOES-CONCLUIDAS', 'ORIENTACOES-CONCLUIDAS-PARA-MESTRADO', 'ORIENTADOR_PRINCIPAL')),
+    ('CO-ORIENTACOES-PARA-MESTRADO',        ('OUTRA-PRODUCAO', 'ORIENTACOES-CONCLUIDAS', 'ORIENTACOES-CONCLUIDAS-PARA-MESTRADO', 'CO_ORIENTADOR')),
+    ('ORIENTACOES-DE-ESPECIALIZACAO',       ('OUTRA-PRODUCAO', 'ORIENTACOES-CONCLUIDAS', 'OUTRAS-ORIENTACOES-CONCLUIDAS', 'MONOGRAFIA_DE_CONCLUSAO_DE_CURSO_APERFEICOAMENTO_E_ESPECIALIZACAO')),
+    ('ORIENTACOES-DE-TCC',                  ('OUTRA-PRODUCAO', 'ORIENTACOES-CONCLUIDAS', 'OUTRAS-ORIENTACOES-CONCLUIDAS', 'TRABALHO_DE_CONCLUSAO_DE_CURSO_GRADUACAO')),
+    ('ORIENTACOES-DE-INICIACAO-CIENTIFICA', ('OUTRA-PRODUCAO', 'ORIENTACOES-CONCLUIDAS', 'OUTRAS-ORIENTACOES-CONCLUIDAS', 'INICIACAO_CIENTIFICA')),
+    ('ORIENTACOES-DE-OUTRA-NATUREZA',       ('OUTRA-PRODUCAO', 'ORIENTACOES-CONCLUIDAS', 'OUTRAS-ORIENTACOES-CONCLUIDAS', 'ORIENTACAO-DE-OUTRA-NATUREZA')),
+]
+
+# Columns of the structured output: identification, total score, number of
+# articles not found in Qualis and the table leaves.
+COLUNAS = ['id', 'nome', 'area', 'departamento', 'score', 'nao_encontrados'] + [ rotulo for rotulo, caminho in CAMPOS ]
+
+# Extra columns of deadline-aware scoring (--deadline): the articles whose DOI
+# could not be looked up in time and the range they may still add to the score.
+PENDENTES = ['pendentes', 'acrescimo_minimo', 'acrescimo_maximo']
+
+# Extra columns of program scoring (--program): how many curricula each
+# record covers and how many of its productions are shared with other members.
+MEMBROS = ['membros', 'compartilhados']
+
+def achata(tabela):
+    resultado = OrderedDict()
+    for rotulo, caminho in CAMPOS:
+        valor = tabela
+        for chave in caminho:
+            valor = valor[chave]
+        resultado[rotulo] = valor
+    return resultado
+
+# Títulos e DOIs comparáveis entre currículos: sem acentos, pontuação ou
+# diferenças de caixa, e DOIs sem o prefixo de URL.
+def normaliza(texto):
+    if isinstance(texto, str):
+        texto = texto.decode('utf-8')
+    return re.sub(r'[^A-Z0-9]+', ' ', unidecode(texto).upper()).strip()
+
+def normaliza_doi(doi):
+    return re.sub(r'^(https?://)?(dx\.)?doi\.org/|^doi:\s*', '', doi.strip().lower())
+
+# Identidade de uma produção, a mesma em todos os currículos que a declaram:
+# o DOI ou, na falta dele, a categoria, o título e o ano (e o ISSN, no caso de
+# artigos). Itens sem título ou sem ano não têm identidade e nunca são tidos
+# como iguais.
+def identidade(categoria, ano, titulo, doi = '', issn = ''):
+    if doi != '':
+        return ('DOI', normaliza_doi(doi))
+    titulo = normaliza(titulo)
+    if titulo == '' or ano == '':
+        return None
+    if categoria == 'ARTIGOS':
+        return (categoria, issn.replace('-', '').strip().upper(), titulo, ano)
+    return (categoria, titulo, ano)
 
 class Score(object):
     """Pontuação do Currículo Lattes"""
-    def __init__(self, root, inicio, fim, area, ano_qualis_periodicos, verbose = 0):
+    def __init__(self, root, inicio, fim, area, qualis_periodicos, verbose = 0, scheduler = None, prazo = None, classificacoes = None):
         # Período considerado para avaliação
         self.__curriculo = root
         self.__numero_identificador = ''
         self.__nome_completo = ''
+        self.__departamento = ''
+        self.__nao_encontrados = 0
         self.__score = 0
         self.__verbose = verbose
         self.__ano_inicio = inicio
         self.__ano_fim = fim
         self.__area = area
-        self.__ano_qualis_periodicos = ano_qualis_periodicos
-        self.__qualis_periodicos = {}
-        self.__qualis_periodicos_issn = {}
+        self.__qualis_periodicos = qualis_periodicos
+        self.__scheduler = scheduler
+        self.__prazo = prazo # instante (time.time()) até o qual se pode consultar DOIs
+        self.__pendentes = [] # artigos cujo DOI não pôde ser consultado dentro do prazo
+        self.__classificacoes = {} if classificacoes is None else classificacoes # identidade do artigo -> estrato
+        self.__itens = [] # (identidade, caminho na tabela) de cada item pontuado
         self.__tabela_de_qualificacao = {
             'FORMACAO-ACADEMICA-TITULACAO' : {'POS-DOUTORADO': 0, 'LIVRE-DOCENCIA': 0, 'DOUTORADO': 0, 'MESTRADO': 0},
             'PROJETO-DE-PESQUISA' : {'PESQUISA': 0, 'DESENVOLVIMENTO': 0},
@@ -101,6 +214,7 @@ class Score(object):
         self.__producao_bibliografica()
         self.__producao_tecnica()
         self.__outra_producao()
+        self.__resolve_pendentes()
         self.__pontuacao_acumulada()
 
     def __pontuacao_acumulada(self):
@@ -134,6 +248,10 @@ class Score(object):
         dados = self.__curriculo.find('DADOS-GERAIS')
         self.__nome_completo = dados.attrib['NOME-COMPLETO']
 
+        endereco = dados.find('ENDERECO/ENDERECO-PROFISSIONAL')
+        if endereco is not None:
+            self.__departamento = endereco.attrib.get('NOME-ORGAO', '')
+
     def __formacao_academica_titulacao(self):
         dados = self.__curriculo.find('DADOS-GERAIS')
         formacao = dados.find('FORMACAO-ACADEMICA-TITULACAO')
@@ -145,10 +263,9 @@ class Score(object):
             if result is None:
                 continue
 
-            if key == 'LIVRE-DOCENCIA': # neste caso, não há STATUS-DO-CURSO
-                self.__tabela_de_qualificacao['FORMACAO-ACADEMICA-TITULACAO'][key] = value
-            elif result.attrib['STATUS-DO-CURSO'] == 'CONCLUIDO':
+            if key == 'LIVRE-DOCENCIA' or result.attrib['STATUS-DO-CURSO'] == 'CONCLUIDO': # na livre-docência, não há STATUS-DO-CURSO
                 self.__tabela_de_qualificacao['FORMACAO-ACADEMICA-TITULACAO'][key] = value
+                self.__itens.append( (('FORMACAO-ACADEMICA-TITULACAO', self.__numero_identificador, key), ('FORMACAO-ACADEMICA-TITULACAO', key)) )
             
     def __projetos_de_pesquisa(self):
         dados = self.__curriculo.find('DADOS-GERAIS')
@@ -177,11 +294,11 @@ class Score(object):
 
                     # Ignorar projeto ou participação em projeto iniciados fora do período estipulado
                     if projeto.attrib['ANO-INICIO'] != "":
-                        if int(projeto.attrib['ANO-INICIO']) < self.__ano_inicio or int(projeto.attrib['ANO-INICIO']) > self.__ano_fim:
-                            continue
+                        inicio_projeto = int(projeto.attrib['ANO-INICIO'])
                     else:
-                        if inicio_part < self.__ano_inicio or inicio_part > self.__ano_fim:
-                            continue
+                        inicio_projeto = inicio_part
+                    if inicio_projeto < self.__ano_inicio or inicio_projeto > self.__ano_fim:
+                        continue
                       
                     # Ignorar se o proponente não for o coordenador do projeto
                     equipe = (projeto.find('EQUIPE-DO-PROJETO')).find('INTEGRANTES-DO-PROJETO')
@@ -203,592 +320,778 @@ class Score(object):
                             break
                     if not fomento_externo:
                         continue
-                    
-                    current = self.__tabela_de_qualificacao['PROJETO-DE-PESQUISA'][natureza]
-                    weight = weights['PROJETO-DE-PESQUISA'][natureza]
-                    bound = bounds['PROJETO-DE-PESQUISA'][natureza]
-                    self.__tabela_de_qualificacao['PROJETO-DE-PESQUISA'][natureza] = self.__clamp(current+weight, bound)
-
-    def __producao_bibliografica(self):
-        producao = self.__curriculo.find('PRODUCAO-BIBLIOGRAFICA')
-        if producao is None:
-            return
 
-        self.__artigos_publicados(producao)
-        self.__trabalhos_em_eventos(producao)
-        self.__livros_e_capitulos(producao)
-        self.__demais_tipos_de_producao(producao)
+                    self.__conta( ('PROJETO-DE-PESQUISA', natureza), identidade('PROJETOS', inicio_projeto, projeto.attrib.get('NOME-DO-PROJETO', '')) )
 
-    def __artigos_publicados(self, producao):
-        artigos = producao.find('ARTIGOS-PUBLICADOS')
-        if artigos is None:
-            return
+    def __producao_bibliografica(self):
+        self.__artigos_publicados()
+        self.__trabalhos_em_eventos()
+        self.__livros_e_capitulos()
+        self.__demais_tipos_de_producao()
+
+    # Local lookups come first: articles already classified (by another member
+    # of the program), found by ISSN, or without a DOI, are counted right away.
+    # Articles that need a DOI request are looked up by journal title, then
+    # left for the end, when all other local work is done, and those that do
+    # not fit in the deadline, or whose
+    # host asked for a longer wait than the scheduler accepts, stay pending
+    # (see get_pendentes and get_acrescimos) instead of counting as not found.
+    def __artigos_publicados(self):
+        remotos = []
+        for ano, doi, issn, periodico, titulo in extrai(self.__curriculo, 'ARTIGOS'):
+            if ano == "": # sem ano, não há como saber se está no período
+                continue
+            ano = int(ano)
+            if self.__ano_inicio <= ano <= self.__ano_fim: # somente os artigos durante o período estabelecido
+                chave = identidade('ARTIGOS', ano, titulo, doi, issn)
+                artigo = (ano, doi, issn, periodico)
+                if chave not in self.__classificacoes and doi != "" and self.__get_qualis_periodicos_from_issn(issn, ano) == 'NAO-ENCONTRADO':
+                    por_titulo = self.__qualis_periodicos.estrato_por_titulo(formata_titulo(periodico), self.__area, ano) != 'NAO-ENCONTRADO'
+                    remotos.append( (chave, artigo, por_titulo) )
+                else:
+                    self.__conta_artigo( chave, self.__classifica(chave, *artigo) )
+        self.__pendentes = remotos
+
+    def __resolve_pendentes(self):
+        remotos = self.__pendentes
+        bloqueados = [] # other hosts may still answer
+        for i, (chave, artigo, por_titulo) in enumerate(remotos):
+            try:
+                estrato = self.__classifica(chave, *artigo)
+            except HostBloqueado:
+                bloqueados.append( (chave, artigo, por_titulo) )
+                continue
+            except PrazoEsgotado:
+                self.__pendentes = bloqueados + remotos[i:]
+                return
+            self.__conta_artigo(chave, estrato)
+        self.__pendentes = bloqueados
+
+    # Each distinct article is classified once, however many curricula declare it.
+    def __classifica(self, chave, ano, doi, issn, periodico):
+        if chave in self.__classificacoes:
+            return self.__classificacoes[chave]
+        estrato = self.__get_qualis_periodicos(ano, doi, issn, periodico)
+        if chave is not None:
+            self.__classificacoes[chave] = estrato
+        return estrato
 
-        self.__carrega_qualis_periodicos() # load Qualis Periodicos
+    def __conta_artigo(self, chave, estrato):
+        if estrato == 'NAO-ENCONTRADO':
+            self.__nao_encontrados += 1
+        self.__conta( ('PRODUCAO-BIBLIOGRAFICA', 'ARTIGOS-PUBLICADOS', estrato), chave )
 
-        for artigo in artigos.findall('ARTIGO-PUBLICADO'):
-            dados = artigo.find('DADOS-BASICOS-DO-ARTIGO')
-            ano = int(dados.attrib['ANO-DO-ARTIGO'])
-            if self.__ano_inicio <= ano <= self.__ano_fim: # somente os artigos durante o período estabelecido
-                estrato = self.__get_qualis_periodicos(artigo)
-                current = self.__tabela_de_qualificacao['PRODUCAO-BIBLIOGRAFICA']['ARTIGOS-PUBLICADOS'][estrato]
-                weight = weights['PRODUCAO-BIBLIOGRAFICA']['ARTIGOS-PUBLICADOS'][estrato]
-                bound = bounds['PRODUCAO-BIBLIOGRAFICA']['ARTIGOS-PUBLICADOS'][estrato]
-                self.__tabela_de_qualificacao['PRODUCAO-BIBLIOGRAFICA']['ARTIGOS-PUBLICADOS'][estrato] = self.__clamp(current+weight, bound)
-
-    def __format_area_name(self, area):
-        area = area.strip().upper()
-        area = unidecode( area.decode("utf-8") )
-        area = area.replace('/', '')
-        area = area.replace(',', '')
-        area = area.replace('  ', ' ') # remove duplicate spaces
-        area = area.replace(' ', '_')
-        return area.replace('Ç', 'C')
-
-    def __carrega_qualis_periodicos(self):
-        with open('qualis-periodicos-'+str(self.__ano_qualis_periodicos)+'.csv', 'rb') as csvfile:
-            reader = csv.reader(csvfile, delimiter=',', quotechar='"')
-            next(reader) # skip headers
-
-            for row in reader:
-                issn = row[0]
-                title = unidecode(row[1].decode("utf-8")).split('(')[0]
-                title = title.strip().upper()
-                area = row[2]
-                estrato = row[3]
-                if self.__format_area_name(area) == self.__area:
-                    self.__qualis_periodicos[issn] = estrato
-                    self.__qualis_periodicos_issn[title] = issn
-
-    # Important: number-only ISSN, i.e., without hyphen.
-    def __get_qualis_periodicos_from_issn(self, issn):
+    # ISSN with or without hyphen. The Qualis edition is the one in force in the article's year.
+    def __get_qualis_periodicos_from_issn(self, issn, ano):
         if issn != "":
-            if issn in self.__qualis_periodicos:
-                return self.__qualis_periodicos[issn]
+            return self.__qualis_periodicos.estrato(issn, self.__area, ano)
         return 'NAO-ENCONTRADO'
 
-    def __get_qualis_periodicos_from_title(self, title):
+    def __get_qualis_periodicos_from_title(self, title, ano):
         if title != "" and title != None:
             if self.__verbose == 1:
-                print '[' + title + ']'
-            if title in self.__qualis_periodicos_issn:
-                return self.__qualis_periodicos[ self.__qualis_periodicos_issn[title] ]
+                print >> sys.stderr, '[' + title + ']'
+            return self.__qualis_periodicos.estrato_por_titulo(title, self.__area, ano)
         return 'NAO-ENCONTRADO'
 
-    def __get_qualis_periodicos(self, artigo):
+    def __get_qualis_periodicos(self, ano, doi, issn, periodico):
         # first, try to extract qualis using the issn from xlm data
-        issn = artigo.find('DETALHAMENTO-DO-ARTIGO').attrib['ISSN']
-        estrato = self.__get_qualis_periodicos_from_issn(issn[0:4] + '-' + issn[4:])
+        estrato = self.__get_qualis_periodicos_from_issn(issn, ano)
         if estrato != 'NAO-ENCONTRADO':
             return estrato
 
         # If you reach here, the issn is not available in Qualis Periodicos.
         # Try to fetch issns from DOI, alternatively.
         if self.__verbose == 1:
-            print 'ISSN ' + issn + ' not found. Trying to fetch ISSNs from DOI'
-        #print self.__nome_completo
-        #print self.__numero_identificador
-        #print issn
+            print >> sys.stderr, 'ISSN ' + issn + ' not found. Trying to fetch ISSNs from DOI'
         doi_title = str()
-        if 'DOI' in artigo.find('DADOS-BASICOS-DO-ARTIGO').attrib:
-            doi = artigo.find('DADOS-BASICOS-DO-ARTIGO').attrib['DOI']
+        if doi != "":
             url = 'http://dx.doi.org/' + doi
             estratos = ['NAO-ENCONTRADO']
-            tries = 0
-            done = False
-            while not done and tries <= 5:
-                tries += 1
-                r = None
-                try:
-                    r = requests.get(url, timeout=3)
-                except requests.exceptions.RequestException as e:
-                    print e
-
-                if r == None:
-                    continue
-                
-                if r.status_code != 200: # if we've got a error, try again, at most 5 times
-                    time.sleep(3.0)
-                    continue
-
+            if self.__scheduler is None:
+                self.__scheduler = Scheduler()
+            r = self.__scheduler.get(url, self.__prazo) # retries and rate limits are handled by the scheduler
+            if r is not None:
                 soup = BeautifulSoup(r.text, "lxml")
                 metas = soup.find_all('meta')
                 issns = [ meta.attrs['content'] for meta in metas if 'name' in meta.attrs and meta.attrs['name'].upper() == 'CITATION_ISSN' ]
                 if self.__verbose == 1:
-                    print 'ISSNs found: ', issns
+                    print >> sys.stderr, 'ISSNs found: ', issns
 
                 for issn in issns:
-                    estratos.append(self.__get_qualis_periodicos_from_issn(issn))
+                    estratos.append(self.__get_qualis_periodicos_from_issn(issn, ano))
 
                 titles = [ meta.attrs['content'] for meta in metas if 'name' in meta.attrs and meta.attrs['name'].upper() == 'CITATION_JOURNAL_TITLE' ]
                 if len(titles) > 0:
                     doi_title = titles[0]
                     doi_title = unidecode( doi_title.decode("utf-8") )
                     doi_title = doi_title.strip().upper()
-                done = True
             estrato = min(estratos)
-        else:
-            print 'DOI does not exist.'
+        elif self.__verbose == 1:
+            print >> sys.stderr, 'DOI does not exist.'
 
         # Last try.
         # We will search the article by the journal title.
         estratos = ['NAO-ENCONTRADO']
         if estrato == 'NAO-ENCONTRADO':
             if self.__verbose == 1:
-                print 'Trying to find Qualis by title...'
-            title = unidecode( (artigo.find('DETALHAMENTO-DO-ARTIGO').attrib['TITULO-DO-PERIODICO-OU-REVISTA']).decode("utf-8") ).split('(')[0]
-            title = title.strip().upper()
-            estratos.append( self.__get_qualis_periodicos_from_title(title) )
-            estratos.append( self.__get_qualis_periodicos_from_title(doi_title) )
+                print >> sys.stderr, 'Trying to find Qualis by title...'
+            title = formata_titulo(periodico)
+            estratos.append( self.__get_qualis_periodicos_from_title(title, ano) )
+            estratos.append( self.__get_qualis_periodicos_from_title(doi_title, ano) )
             estrato = min(estratos)
 
             
             if self.__verbose == 1:
                 if estrato == 'NAO-ENCONTRADO':
-                    print 'Title not found: ' + title + '\n'
+                    print >> sys.stderr, 'Title not found: ' + title + '\n'
                 else:
-                    print 'Success. Qualis = ' + estrato + '\n'
+                    print >> sys.stderr, 'Success. Qualis = ' + estrato + '\n'
 
         return estrato
 
     def __clamp(self,x,upper):
         return max(min(float(upper),x), 0)
 
-    def __trabalhos_em_eventos(self, producao):
-        trabalhos = producao.find('TRABALHOS-EM-EVENTOS')
-        if trabalhos is None:
-            return
-        for trabalho in trabalhos.findall('TRABALHO-EM-EVENTOS'):
-            ano = int(trabalho.find('DADOS-BASICOS-DO-TRABALHO').attrib['ANO-DO-TRABALHO'])
+    # Soma o peso de um item à folha da tabela dada pelo caminho de chaves em
+    # Weights.py, até o limite em Bounds.py, e registra o item com a sua
+    # identidade, para a pontuação de programas (veja Programa).
+    def __conta(self, caminho, chave):
+        tabela, pesos, limites = self.__tabela_de_qualificacao, weights, bounds
+        for k in caminho[:-1]:
+            tabela, pesos, limites = tabela[k], pesos[k], limites[k]
+        folha = caminho[-1]
+        tabela[folha] = self.__clamp(tabela[folha] + pesos[folha], limites[folha])
+
+        if chave is None: # um item sem identidade só é igual a si mesmo
+            chave = (self.__numero_identificador, len(self.__itens))
+        self.__itens.append( (chave, tuple(caminho)) )
+
+    def __trabalhos_em_eventos(self):
+        for ano, abrangencia, natureza, titulo in extrai(self.__curriculo, 'TRABALHOS-EM-EVENTOS'):
+            if ano == "":
+                continue
+            ano = int(ano)
             if ano < self.__ano_inicio or ano > self.__ano_fim: # skip papers out-of-period
                 continue
 
-            abrangencia = trabalho.find('DETALHAMENTO-DO-TRABALHO').attrib['CLASSIFICACAO-DO-EVENTO']
-            natureza = trabalho.find('DADOS-BASICOS-DO-TRABALHO').attrib['NATUREZA']
+            self.__conta( ('PRODUCAO-BIBLIOGRAFICA', 'TRABALHOS-EM-EVENTOS', abrangencia, natureza), identidade('TRABALHOS-EM-EVENTOS', ano, titulo) )
 
-            current = self.__tabela_de_qualificacao['PRODUCAO-BIBLIOGRAFICA']['TRABALHOS-EM-EVENTOS'][abrangencia][natureza]
-            weight = weights['PRODUCAO-BIBLIOGRAFICA']['TRABALHOS-EM-EVENTOS'][abrangencia][natureza]
-            bound = bounds['PRODUCAO-BIBLIOGRAFICA']['TRABALHOS-EM-EVENTOS'][abrangencia][natureza]
-            self.__tabela_de_qualificacao['PRODUCAO-BIBLIOGRAFICA']['TRABALHOS-EM-EVENTOS'][abrangencia][natureza] = self.__clamp(current+weight, bound)
-
-    def __livros_e_capitulos(self, producao):
-        itens = producao.find('LIVROS-E-CAPITULOS')
-        if itens is None:
-            return
-        livros = itens.find('LIVROS-PUBLICADOS-OU-ORGANIZADOS')
-        if livros != None:
-            for livro in livros.findall('LIVRO-PUBLICADO-OU-ORGANIZADO'):
-                ano = int(livro.find('DADOS-BASICOS-DO-LIVRO').attrib['ANO'])
-                if ano < self.__ano_inicio or ano > self.__ano_fim: # skip out-of-allowed-period production
-                    continue
-                if livro.find('DETALHAMENTO-DO-LIVRO').attrib['NUMERO-DE-PAGINAS'] == "":
-                    continue
-                paginas = int(livro.find('DETALHAMENTO-DO-LIVRO').attrib['NUMERO-DE-PAGINAS'])
-                if paginas > 49: # número mínimo de páginas para livros publicados e traduções
-                    tipo = livro.find('DADOS-BASICOS-DO-LIVRO').attrib['TIPO']
-
-                    current = self.__tabela_de_qualificacao['PRODUCAO-BIBLIOGRAFICA']['LIVROS-E-CAPITULOS']['LIVRO-PUBLICADO-OU-ORGANIZADO'][tipo]
-                    weight = weights['PRODUCAO-BIBLIOGRAFICA']['LIVROS-E-CAPITULOS']['LIVRO-PUBLICADO-OU-ORGANIZADO'][tipo]
-                    bound = bounds['PRODUCAO-BIBLIOGRAFICA']['LIVROS-E-CAPITULOS']['LIVRO-PUBLICADO-OU-ORGANIZADO'][tipo]
-
-                    self.__tabela_de_qualificacao['PRODUCAO-BIBLIOGRAFICA']['LIVROS-E-CAPITULOS']['LIVRO-PUBLICADO-OU-ORGANIZADO'][tipo] = self.__clamp(current+weight, bound)
-
-        capitulos = itens.find('CAPITULOS-DE-LIVROS-PUBLICADOS')
-        if capitulos != None:
-            for capitulo in capitulos.findall('CAPITULO-DE-LIVRO-PUBLICADO'):
-                if capitulo.find('DADOS-BASICOS-DO-CAPITULO').attrib['ANO'] == "":
-                    continue
-                ano = int(capitulo.find('DADOS-BASICOS-DO-CAPITULO').attrib['ANO'])
-                if ano < self.__ano_inicio or ano > self.__ano_fim: # skip out-of-allowed-period production
-                    continue
-
-                current = self.__tabela_de_qualificacao['PRODUCAO-BIBLIOGRAFICA']['LIVROS-E-CAPITULOS']['CAPITULO-DE-LIVRO-PUBLICADO']
-                weight = weights['PRODUCAO-BIBLIOGRAFICA']['LIVROS-E-CAPITULOS']['CAPITULO-DE-LIVRO-PUBLICADO']
-                bound = bounds['PRODUCAO-BIBLIOGRAFICA']['LIVROS-E-CAPITULOS']['CAPITULO-DE-LIVRO-PUBLICADO']
-
-                self.__tabela_de_qualificacao['PRODUCAO-BIBLIOGRAFICA']['LIVROS-E-CAPITULOS']['CAPITULO-DE-LIVRO-PUBLICADO'] = self.__clamp(current+weight, bound)
-
-    def __demais_tipos_de_producao(self, producao):
-        itens = producao.find('DEMAIS-TIPOS-DE-PRODUCAO-BIBLIOGRAFICA')
-        if itens is None:
-            return
-        traducoes = itens.findall('TRADUCAO')
-        for traducao in traducoes:
-            ano = int(traducao.find('DADOS-BASICOS-DA-TRADUCAO').attrib['ANO'])
+    def __livros_e_capitulos(self):
+        for ano, paginas, tipo, titulo in extrai(self.__curriculo, 'LIVROS'):
+            if ano == "":
+                continue
+            ano = int(ano)
             if ano < self.__ano_inicio or ano > self.__ano_fim: # skip out-of-allowed-period production
                 continue
-            if traducao.find('DETALHAMENTO-DA-TRADUCAO').attrib['NUMERO-DE-PAGINAS'] == "":
+            if paginas == "":
                 continue
-            paginas = int(traducao.find('DETALHAMENTO-DA-TRADUCAO').attrib['NUMERO-DE-PAGINAS'])
-            if paginas > 49: # número mínimo de páginas para livros publicados e traduções
-                current = self.__tabela_de_qualificacao['PRODUCAO-BIBLIOGRAFICA']['DEMAIS-TIPOS-DE-PRODUCAO-BIBLIOGRAFICA']['TRADUCAO']
-                weight = weights['PRODUCAO-BIBLIOGRAFICA']['DEMAIS-TIPOS-DE-PRODUCAO-BIBLIOGRAFICA']['TRADUCAO']
-                bound = bounds['PRODUCAO-BIBLIOGRAFICA']['DEMAIS-TIPOS-DE-PRODUCAO-BIBLIOGRAFICA']['TRADUCAO']
+            if int(paginas) > 49: # número mínimo de páginas para livros publicados e traduções
+                self.__conta( ('PRODUCAO-BIBLIOGRAFICA', 'LIVROS-E-CAPITULOS', 'LIVRO-PUBLICADO-OU-ORGANIZADO', tipo), identidade('LIVROS', ano, titulo) )
 
-                self.__tabela_de_qualificacao['PRODUCAO-BIBLIOGRAFICA']['DEMAIS-TIPOS-DE-PRODUCAO-BIBLIOGRAFICA']['TRADUCAO'] = self.__clamp(current+weight, bound)
-
-    def __producao_tecnica(self):
-        producao = self.__curriculo.find('PRODUCAO-TECNICA')
-        if producao is None:
-            return
-
-        self.__softwares(producao)
-        self.__patentes(producao)
-        self.__produtos_tecnologicos(producao)
-        self.__processos_ou_tecnicas(producao)
-        self.__trabalho_tecnico(producao)
-
-    def __softwares(self, producao):
-        softwares = producao.findall('SOFTWARE')
-        if softwares is None:
-            return
-        for software in softwares:
-            dados = software.find('DADOS-BASICOS-DO-SOFTWARE')
-            ano = dados.attrib['ANO']
+        for ano, titulo in extrai(self.__curriculo, 'CAPITULOS'):
             if ano == "":
                 continue
-            elif self.__ano_inicio <= int(ano) <= self.__ano_fim: # somente os artigos dirante o período estipulado
-                current = self.__tabela_de_qualificacao['PRODUCAO-TECNICA']['SOFTWARE']
-                weight = weights['PRODUCAO-TECNICA']['SOFTWARE']
-                bound = bounds['PRODUCAO-TECNICA']['SOFTWARE']
-
-                self.__tabela_de_qualificacao['PRODUCAO-TECNICA']['SOFTWARE'] = self.__clamp(current+weight, bound)
-
-    def __patentes(self, producao):
-        patentes = producao.findall('PATENTE')
-        if patentes is None:
-            return
-        for patente in patentes:
-            detalhamento = patente.find('DETALHAMENTO-DA-PATENTE')
-            registro = detalhamento.find('REGISTRO-OU-PATENTE')
-            deposito = (registro.attrib['DATA-PEDIDO-DE-DEPOSITO'])[4:]
-            concessao = (registro.attrib['DATA-DE-CONCESSAO'])[4:]
-            if concessao != "":
-                if self.__ano_inicio <= int(concessao) <= self.__ano_fim:
-                    current = self.__tabela_de_qualificacao['PRODUCAO-TECNICA']['PATENTE']['CONCEDIDA']
-                    weight = weights['PRODUCAO-TECNICA']['PATENTE']['CONCEDIDA']
-                    bound = bounds['PRODUCAO-TECNICA']['PATENTE']['CONCEDIDA']
-                    self.__tabela_de_qualificacao['PRODUCAO-TECNICA']['PATENTE']['CONCEDIDA'] = self.__clamp(current+weight, bound)
-            elif deposito != "":
-                if self.__ano_inicio <= int(deposito) <= self.__ano_fim:
-                    current = self.__tabela_de_qualificacao['PRODUCAO-TECNICA']['PATENTE']['DEPOSITADA']
-                    weight = weights['PRODUCAO-TECNICA']['PATENTE']['DEPOSITADA']
-                    bound = bounds['PRODUCAO-TECNICA']['PATENTE']['DEPOSITADA']
-                    self.__tabela_de_qualificacao['PRODUCAO-TECNICA']['PATENTE']['DEPOSITADA'] = self.__clamp(current+weight, bound)
-
-    def __produtos_tecnologicos(self, producao):
-        produtos = producao.findall('PRODUTO-TECNOLOGICO')
-        if produtos is None:
-            return
-        for produto in produtos:
-            dados = produto.find('DADOS-BASICOS-DO-PRODUTO-TECNOLOGICO')
-            ano = dados.attrib['ANO']
-            if ano == "":
+            ano = int(ano)
+            if ano < self.__ano_inicio or ano > self.__ano_fim: # skip out-of-allowed-period production
                 continue
 
-            if self.__ano_inicio <= int(ano) <= self.__ano_fim:
-                current = self.__tabela_de_qualificacao['PRODUCAO-TECNICA']['PRODUTO-TECNOLOGICO']
-                weight = weights['PRODUCAO-TECNICA']['PRODUTO-TECNOLOGICO']
-                bound = bounds['PRODUCAO-TECNICA']['PRODUTO-TECNOLOGICO']
-                self.__tabela_de_qualificacao['PRODUCAO-TECNICA']['PRODUTO-TECNOLOGICO'] = self.__clamp(current+weight, bound)
-
-    def __processos_ou_tecnicas(self, producao):
-        processos = producao.findall('PROCESSOS-OU-TECNICAS')
-        if processos is None:
-            return
-        for processo in processos:
-            dados = processo.find('DADOS-BASICOS-DO-PROCESSOS-OU-TECNICAS')
-            ano = dados.attrib['ANO']
-            if ano == "":
-                continue
+            self.__conta( ('PRODUCAO-BIBLIOGRAFICA', 'LIVROS-E-CAPITULOS', 'CAPITULO-DE-LIVRO-PUBLICADO'), identidade('CAPITULOS', ano, titulo) )
 
-            if self.__ano_inicio <= int(ano) <= self.__ano_fim:
-                current = self.__tabela_de_qualificacao['PRODUCAO-TECNICA']['PROCESSOS-OU-TECNICAS']
-                weight = weights['PRODUCAO-TECNICA']['PROCESSOS-OU-TECNICAS']
-                bound = bounds['PRODUCAO-TECNICA']['PROCESSOS-OU-TECNICAS']
-                self.__tabela_de_qualificacao['PRODUCAO-TECNICA']['PROCESSOS-OU-TECNICAS'] = self.__clamp(current+weight, bound)
-
-    def __trabalho_tecnico(self, producao):
-        trabalhos = producao.findall('TRABALHO-TECNICO')
-        if trabalhos is None:
-            return
-        for trabalho in trabalhos:
-            dados = trabalho.find('DADOS-BASICOS-DO-TRABALHO-TECNICO')
-            ano = dados.attrib['ANO']
+    def __demais_tipos_de_producao(self):
+        for ano, paginas, titulo in extrai(self.__curriculo, 'TRADUCOES'):
             if ano == "":
                 continue
-
-            if self.__ano_inicio <= int(ano) <= self.__ano_fim:
-                current = self.__tabela_de_qualificacao['PRODUCAO-TECNICA']['TRABALHO-TECNICO']
-                weight = weights['PRODUCAO-TECNICA']['TRABALHO-TECNICO']
-                bound = bounds['PRODUCAO-TECNICA']['TRABALHO-TECNICO']
-                self.__tabela_de_qualificacao['PRODUCAO-TECNICA']['TRABALHO-TECNICO'] = self.__clamp(current+weight, bound)
-
-    def __outra_producao(self):
-        producao = self.__curriculo.find('OUTRA-PRODUCAO')
-        if producao is None:
-            return
-
-        if self.__area == 'ARTES_MUSICA': # only counts for arts and musics projects
-            self.__producao_artistica_cultural(producao)
-        self.__orientacoes_concluidas(producao)
-
-    def __producao_artistica_cultural(self, producao):
-        obras = producao.find('PRODUCAO-ARTISTICA-CULTURAL')
-        if obras is None:
-            return
-
-        self.__apresentacao_de_obra_artistica(obras)
-        self.__composicao_musical(obras)
-        self.__obra_de_artes_visuais(obras)
-
-    def __apresentacao_de_obra_artistica(self, obras):
-        apresentacoes = obras.findall('APRESENTACAO-DE-OBRA-ARTISTICA')
-        if apresentacoes is None:
-            return
-
-        for apresentacao in apresentacoes:
-            dados = apresentacao.find('DADOS-BASICOS-DA-APRESENTACAO-DE-OBRA-ARTISTICA')
-            ano = dados.attrib['ANO']
-            if ano == "":
+            ano = int(ano)
+            if ano < self.__ano_inicio or ano > self.__ano_fim: # skip out-of-allowed-period production
                 continue
-
-            if self.__ano_inicio <= int(ano) <= self.__ano_fim:
-                current = self.__tabela_de_qualificacao['OUTRA-PRODUCAO']['PRODUCAO-ARTISTICA-CULTURAL']['APRESENTACAO-DE-OBRA-ARTISTICA']
-                weight = weights['OUTRA-PRODUCAO']['PRODUCAO-ARTISTICA-CULTURAL']['APRESENTACAO-DE-OBRA-ARTISTICA']
-                bound = bounds['OUTRA-PRODUCAO']['PRODUCAO-ARTISTICA-CULTURAL']['APRESENTACAO-DE-OBRA-ARTISTICA']
-                self.__tabela_de_qualificacao['OUTRA-PRODUCAO']['PRODUCAO-ARTISTICA-CULTURAL']['APRESENTACAO-DE-OBRA-ARTISTICA'] = self.__clamp(current+weight, bound)
-
-    def __composicao_musical(self, obras):
-        composicoes = obras.findall('COMPOSICAO-MUSICAL')
-        if composicoes is None:
-            return
-
-        for composicao in composicoes:
-            dados = composicao.find('DADOS-BASICOS-DA-COMPOSICAO-MUSICAL')
-            ano = dados.attrib['ANO']
-            if ano == "":
+            if paginas == "":
                 continue
+            if int(paginas) > 49: # número mínimo de páginas para livros publicados e traduções
+                self.__conta( ('PRODUCAO-BIBLIOGRAFICA', 'DEMAIS-TIPOS-DE-PRODUCAO-BIBLIOGRAFICA', 'TRADUCAO'), identidade('TRADUCOES', ano, titulo) )
 
-            if self.__ano_inicio <= int(ano) <= self.__ano_fim:
-                current = self.__tabela_de_qualificacao['OUTRA-PRODUCAO']['PRODUCAO-ARTISTICA-CULTURAL']['COMPOSICAO-MUSICAL']
-                weight = weights['OUTRA-PRODUCAO']['PRODUCAO-ARTISTICA-CULTURAL']['COMPOSICAO-MUSICAL']
-                bound = bounds['OUTRA-PRODUCAO']['PRODUCAO-ARTISTICA-CULTURAL']['COMPOSICAO-MUSICAL']
-                self.__tabela_de_qualificacao['OUTRA-PRODUCAO']['PRODUCAO-ARTISTICA-CULTURAL']['COMPOSICAO-MUSICAL'] = self.__clamp(current+weight, bound)
-
-    def __obra_de_artes_visuais(self, obras):
-        artes = obras.findall('OBRA-DE-ARTES-VISUAIS')
-        if artes is None:
-            return
-
-        for arte in artes:
-            dados = arte.find('DADOS-BASICOS-DA-OBRA-DE-ARTES-VISUAIS')
-            ano = dados.attrib['ANO']
+    def __producao_tecnica(self):
+        self.__softwares()
+        self.__patentes()
+        self.__produtos_tecnologicos()
+        self.__processos_ou_tecnicas()
+        self.__trabalho_tecnico()
+
+    # Conta na folha dada pelo caminho cada item da categoria com ANO no período.
+    def __conta_por_ano(self, categoria, caminho):
+        for ano, titulo in extrai(self.__curriculo, categoria):
             if ano == "":
                 continue
-
             if self.__ano_inicio <= int(ano) <= self.__ano_fim:
-                current = self.__tabela_de_qualificacao['OUTRA-PRODUCAO']['PRODUCAO-ARTISTICA-CULTURAL']['OBRA-DE-ARTES-VISUAIS']
-                weight = weights['OUTRA-PRODUCAO']['PRODUCAO-ARTISTICA-CULTURAL']['OBRA-DE-ARTES-VISUAIS']
-                bound = bounds['OUTRA-PRODUCAO']['PRODUCAO-ARTISTICA-CULTURAL']['OBRA-DE-ARTES-VISUAIS']
-                self.__tabela_de_qualificacao['OUTRA-PRODUCAO']['PRODUCAO-ARTISTICA-CULTURAL']['OBRA-DE-ARTES-VISUAIS'] = self.__clamp(current+weight, bound)
-
-    def __orientacoes_concluidas(self, producao):
-        orientacoes = producao.find('ORIENTACOES-CONCLUIDAS')
-        if orientacoes is None:
-            return
+                self.__conta( caminho, identidade(categoria, int(ano), titulo) )
 
-        self.__orientacoes_pos_doutorado(orientacoes)
-        self.__orientacoes_doutorado(orientacoes)
-        self.__orientacoes_mestrado(orientacoes)
-        self.__outras_orientacoes_concluidas(orientacoes)
+    def __softwares(self):
+        self.__conta_por_ano('SOFTWARES', ['PRODUCAO-TECNICA', 'SOFTWARE'])
 
-    def __orientacoes_pos_doutorado(self, orientacoes):
-        postdocs = orientacoes.findall('ORIENTACOES-CONCLUIDAS-PARA-POS-DOUTORADO')
-        if postdocs is None:
-            return
+    def __patentes(self):
+        for deposito, concessao, titulo in extrai(self.__curriculo, 'PATENTES'):
+            deposito = deposito[4:]
+            concessao = concessao[4:]
+            chave = identidade('PATENTES', deposito or concessao, titulo) # a mesma patente, concedida ou não
+            if concessao != "":
+                if self.__ano_inicio <= int(concessao) <= self.__ano_fim:
+                    self.__conta( ('PRODUCAO-TECNICA', 'PATENTE', 'CONCEDIDA'), chave )
+            elif deposito != "":
+                if self.__ano_inicio <= int(deposito) <= self.__ano_fim:
+                    self.__conta( ('PRODUCAO-TECNICA', 'PATENTE', 'DEPOSITADA'), chave )
 
-        for postdoc in postdocs:
-            dados = postdoc.find('DADOS-BASICOS-DE-ORIENTACOES-CONCLUIDAS-PARA-POS-DOUTORADO')
-            ano = dados.attrib['ANO']
-            if ano == "":
-                continue
+    def __produtos_tecnologicos(self):
+        self.__conta_por_ano('PRODUTOS-TECNOLOGICOS', ['PRODUCAO-TECNICA', 'PRODUTO-TECNOLOGICO'])
 
-            if self.__ano_inicio <= int(ano) <= self.__ano_fim:
-                current = self.__tabela_de_qualificacao['OUTRA-PRODUCAO']['ORIENTACOES-CONCLUIDAS']['ORIENTACOES-CONCLUIDAS-PARA-POS-DOUTORADO']
-                weight = weights['OUTRA-PRODUCAO']['ORIENTACOES-CONCLUIDAS']['ORIENTACOES-CONCLUIDAS-PARA-POS-DOUTORADO']
-                bound = bounds['OUTRA-PRODUCAO']['ORIENTACOES-CONCLUIDAS']['ORIENTACOES-CONCLUIDAS-PARA-POS-DOUTORADO']
-                self.__tabela_de_qualificacao['OUTRA-PRODUCAO']['ORIENTACOES-CONCLUIDAS']['ORIENTACOES-CONCLUIDAS-PARA-POS-DOUTORADO'] = self.__clamp(current+weight, bound)
-
-    def __orientacoes_doutorado(self, orientacoes):
-        doutores = orientacoes.findall('ORIENTACOES-CONCLUIDAS-PARA-DOUTORADO')
-        if doutores is None:
-            return
+    def __processos_ou_tecnicas(self):
+        self.__conta_por_ano('PROCESSOS-OU-TECNICAS', ['PRODUCAO-TECNICA', 'PROCESSOS-OU-TECNICAS'])
+
+    def __trabalho_tecnico(self):
+        self.__conta_por_ano('TRABALHOS-TECNICOS', ['PRODUCAO-TECNICA', 'TRABALHO-TECNICO'])
 
-        for doutor in doutores:
-            dados = doutor.find('DADOS-BASICOS-DE-ORIENTACOES-CONCLUIDAS-PARA-DOUTORADO')
-            ano = dados.attrib['ANO']
+    def __outra_producao(self):
+        if self.__area == 'ARTES_MUSICA': # only counts for arts and musics projects
+            self.__producao_artistica_cultural()
+        self.__orientacoes_concluidas()
+
+    def __producao_artistica_cultural(self):
+        self.__conta_por_ano('APRESENTACOES-DE-OBRAS-ARTISTICAS', ['OUTRA-PRODUCAO', 'PRODUCAO-ARTISTICA-CULTURAL', 'APRESENTACAO-DE-OBRA-ARTISTICA'])
+        self.__conta_por_ano('COMPOSICOES-MUSICAIS', ['OUTRA-PRODUCAO', 'PRODUCAO-ARTISTICA-CULTURAL', 'COMPOSICAO-MUSICAL'])
+        self.__conta_por_ano('OBRAS-DE-ARTES-VISUAIS', ['OUTRA-PRODUCAO', 'PRODUCAO-ARTISTICA-CULTURAL', 'OBRA-DE-ARTES-VISUAIS'])
+
+    def __orientacoes_concluidas(self):
+        self.__conta_por_ano('ORIENTACOES-POS-DOUTORADO', ['OUTRA-PRODUCAO', 'ORIENTACOES-CONCLUIDAS', 'ORIENTACOES-CONCLUIDAS-PARA-POS-DOUTORADO'])
+        self.__orientacoes_doutorado()
+        self.__orientacoes_mestrado()
+        self.__outras_orientacoes_concluidas()
+
+    def __orientacoes_doutorado(self):
+        for ano, tipo, titulo in extrai(self.__curriculo, 'ORIENTACOES-DOUTORADO'):
             if ano == "":
                 continue
 
             if self.__ano_inicio <= int(ano) <= self.__ano_fim:
-                detalhamento = doutor.find('DETALHAMENTO-DE-ORIENTACOES-CONCLUIDAS-PARA-DOUTORADO')
-                tipo = detalhamento.attrib['TIPO-DE-ORIENTACAO']
-                current = self.__tabela_de_qualificacao['OUTRA-PRODUCAO']['ORIENTACOES-CONCLUIDAS']['ORIENTACOES-CONCLUIDAS-PARA-DOUTORADO'][tipo]
-                weight = weights['OUTRA-PRODUCAO']['ORIENTACOES-CONCLUIDAS']['ORIENTACOES-CONCLUIDAS-PARA-DOUTORADO'][tipo]
-                bound = bounds['OUTRA-PRODUCAO']['ORIENTACOES-CONCLUIDAS']['ORIENTACOES-CONCLUIDAS-PARA-DOUTORADO'][tipo]
-                self.__tabela_de_qualificacao['OUTRA-PRODUCAO']['ORIENTACOES-CONCLUIDAS']['ORIENTACOES-CONCLUIDAS-PARA-DOUTORADO'][tipo] = self.__clamp(current+weight, bound)
-
-    def __orientacoes_mestrado(self, orientacoes):
-        mestres = orientacoes.findall('ORIENTACOES-CONCLUIDAS-PARA-MESTRADO')
-        if mestres is None:
-            return
+                self.__conta( ('OUTRA-PRODUCAO', 'ORIENTACOES-CONCLUIDAS', 'ORIENTACOES-CONCLUIDAS-PARA-DOUTORADO', tipo), identidade('ORIENTACOES-DOUTORADO', int(ano), titulo) )
 
-        for mestre in mestres:
-            dados = mestre.find('DADOS-BASICOS-DE-ORIENTACOES-CONCLUIDAS-PARA-MESTRADO')
-            ano = dados.attrib['ANO']
+    def __orientacoes_mestrado(self):
+        for ano, tipo, titulo in extrai(self.__curriculo, 'ORIENTACOES-MESTRADO'):
             if ano == "":
                 continue
 
             if self.__ano_inicio <= int(ano) <= self.__ano_fim:
-                detalhamento = mestre.find('DETALHAMENTO-DE-ORIENTACOES-CONCLUIDAS-PARA-MESTRADO')
-                tipo = detalhamento.attrib['TIPO-DE-ORIENTACAO']
-                current = self.__tabela_de_qualificacao['OUTRA-PRODUCAO']['ORIENTACOES-CONCLUIDAS']['ORIENTACOES-CONCLUIDAS-PARA-MESTRADO'][tipo]
-                weight = weights['OUTRA-PRODUCAO']['ORIENTACOES-CONCLUIDAS']['ORIENTACOES-CONCLUIDAS-PARA-MESTRADO'][tipo]
-                bound = bounds['OUTRA-PRODUCAO']['ORIENTACOES-CONCLUIDAS']['ORIENTACOES-CONCLUIDAS-PARA-MESTRADO'][tipo]
-                self.__tabela_de_qualificacao['OUTRA-PRODUCAO']['ORIENTACOES-CONCLUIDAS']['ORIENTACOES-CONCLUIDAS-PARA-MESTRADO'][tipo] = self.__clamp(current+weight, bound)
-
-    def __outras_orientacoes_concluidas(self, orientacoes):
-        estudantes = orientacoes.findall('OUTRAS-ORIENTACOES-CONCLUIDAS')
-        if estudantes is None:
-            return
+                self.__conta( ('OUTRA-PRODUCAO', 'ORIENTACOES-CONCLUIDAS', 'ORIENTACOES-CONCLUIDAS-PARA-MESTRADO', tipo), identidade('ORIENTACOES-MESTRADO', int(ano), titulo) )
 
-        for estudante in estudantes:
-            dados = estudante.find('DADOS-BASICOS-DE-OUTRAS-ORIENTACOES-CONCLUIDAS')
-            ano = dados.attrib['ANO']
+    def __outras_orientacoes_concluidas(self):
+        for ano, natureza, titulo in extrai(self.__curriculo, 'OUTRAS-ORIENTACOES'):
             if ano == "":
                 continue
 
             if self.__ano_inicio <= int(ano) <= self.__ano_fim:
-                natureza = dados.attrib['NATUREZA']
-                current = self.__tabela_de_qualificacao['OUTRA-PRODUCAO']['ORIENTACOES-CONCLUIDAS']['OUTRAS-ORIENTACOES-CONCLUIDAS'][natureza]
-                weight = weights['OUTRA-PRODUCAO']['ORIENTACOES-CONCLUIDAS']['OUTRAS-ORIENTACOES-CONCLUIDAS'][natureza]
-                bound = bounds['OUTRA-PRODUCAO']['ORIENTACOES-CONCLUIDAS']['OUTRAS-ORIENTACOES-CONCLUIDAS'][natureza]
-                self.__tabela_de_qualificacao['OUTRA-PRODUCAO']['ORIENTACOES-CONCLUIDAS']['OUTRAS-ORIENTACOES-CONCLUIDAS'][natureza] = self.__clamp(current+weight, bound)
+                self.__conta( ('OUTRA-PRODUCAO', 'ORIENTACOES-CONCLUIDAS', 'OUTRAS-ORIENTACOES-CONCLUIDAS', natureza), identidade('OUTRAS-ORIENTACOES', int(ano), titulo) )
 
     def get_name(self):
         return self.__nome_completo
 
+    def get_departamento(self):
+        return self.__departamento
+
+    def get_nao_encontrados(self):
+        return self.__nao_encontrados
+
     def get_lattes_id(self):
         return self.__numero_identificador
 
     def get_score(self):
         return self.__score
 
+    def get_tabela_de_qualificacao(self):
+        return achata(self.__tabela_de_qualificacao)
+
+    def get_pendentes(self):
+        return [ {'ano': ano, 'doi': doi, 'issn': issn, 'periodico': periodico} for chave, (ano, doi, issn, periodico), por_titulo in self.__pendentes ]
+
+    def get_itens(self):
+        """Pares (identidade, caminho na tabela) dos itens pontuados, na ordem do currículo"""
+        return list(self.__itens)
+
+    # Smallest and largest amount the pending articles may still add to the
+    # score. Each of them may end up in any stratum (the DOI may lead to any
+    # ISSN), except that one whose journal title is in Qualis cannot end up
+    # not found: failing the DOI, it falls back to the title. The extremes are
+    # found over every split of the pending articles among the strata, given
+    # the current table, weights and bounds.
+    def get_acrescimos(self):
+        tabela = self.__tabela_de_qualificacao['PRODUCAO-BIBLIOGRAFICA']['ARTIGOS-PUBLICADOS']
+        k = len(self.__pendentes)
+        sem_titulo = sum( 1 for chave, artigo, por_titulo in self.__pendentes if not por_titulo )
+        extremos = [(0, 0)] + [None] * k # extremos[n]: (mínimo, máximo) com n artigos nos estratos já vistos
+        for estrato, atual in tabela.items():
+            weight = weights['PRODUCAO-BIBLIOGRAFICA']['ARTIGOS-PUBLICADOS'][estrato]
+            bound = bounds['PRODUCAO-BIBLIOGRAFICA']['ARTIGOS-PUBLICADOS'][estrato]
+            ganhos = [ self.__clamp(atual + n * weight, bound) - atual for n in range(k + 1) ]
+            limite = sem_titulo if estrato == 'NAO-ENCONTRADO' else k
+            novos = []
+            for n in range(k + 1):
+                opcoes = [ (extremos[n - m][0] + ganhos[m], extremos[n - m][1] + ganhos[m]) for m in range(min(n, limite) + 1) if extremos[n - m] is not None ]
+                novos.append( (min(opcoes)[0], max( maximo for minimo, maximo in opcoes )) if opcoes else None )
+            extremos = novos
+        return extremos[k]
+
+    def resolve_pendentes(self, prazo = None):
+        """Consulta os DOIs dos artigos pendentes, agora até o novo prazo (ou sem prazo)"""
+        self.__prazo = prazo
+        self.__resolve_pendentes()
+        self.__pontuacao_acumulada()
+
+    def get_registro(self):
+        registro = { 'id': self.__numero_identificador, 'nome': self.__nome_completo, 'area': self.__area,
+            'departamento': self.__departamento, 'score': self.__score, 'nao_encontrados': self.__nao_encontrados }
+        registro.update( self.get_tabela_de_qualificacao() )
+        registro['pendentes'] = self.get_pendentes()
+        registro['acrescimo_minimo'], registro['acrescimo_maximo'] = self.get_acrescimos()
+        return registro
+
     def sumario(self):
         print self.__nome_completo.encode("utf-8")
         print "ID Lattes: " + self.__numero_identificador
         print "Área de avaliação: " + self.__area
-        print "POS-DOUTORADO:                       ".decode("utf8") + str(self.__tabela_de_qualificacao['FORMACAO-ACADEMICA-TITULACAO']['POS-DOUTORADO']).encode("utf-8")
-        print "LIVRE-DOCENCIA:                      ".decode("utf8") + str(self.__tabela_de_qualificacao['FORMACAO-ACADEMICA-TITULACAO']['LIVRE-DOCENCIA']).encode("utf-8")
-        print "DOUTORADO:                           ".decode("utf8") + str(self.__tabela_de_qualificacao['FORMACAO-ACADEMICA-TITULACAO']['DOUTORADO']).encode("utf-8")
-        print "MESTRADO:                            ".decode("utf8") + str(self.__tabela_de_qualificacao['FORMACAO-ACADEMICA-TITULACAO']['MESTRADO']).encode("utf-8")
-
-        print "PROJETO-DE-PESQUISA:                 ".decode("utf8") + str(self.__tabela_de_qualificacao['PROJETO-DE-PESQUISA']['PESQUISA']).encode("utf-8")
-        print "PROJETO-DE-DESENVOLVIMENTO:          ".decode("utf8") + str(self.__tabela_de_qualificacao['PROJETO-DE-PESQUISA']['DESENVOLVIMENTO']).encode("utf-8")
-
-        print "ARTIGOS-PUBLICADOS-QUALIS-A1:        ".decode("utf8") + str(self.__tabela_de_qualificacao['PRODUCAO-BIBLIOGRAFICA']['ARTIGOS-PUBLICADOS']['A1']).encode("utf-8")
-        print "ARTIGOS-PUBLICADOS-QUALIS-A2:        ".decode("utf8") + str(self.__tabela_de_qualificacao['PRODUCAO-BIBLIOGRAFICA']['ARTIGOS-PUBLICADOS']['A2']).encode("utf-8")
-        print "ARTIGOS-PUBLICADOS-QUALIS-B1:        ".decode("utf8") + str(self.__tabela_de_qualificacao['PRODUCAO-BIBLIOGRAFICA']['ARTIGOS-PUBLICADOS']['B1']).encode("utf-8")
-        print "ARTIGOS-PUBLICADOS-QUALIS-B2:        ".decode("utf8") + str(self.__tabela_de_qualificacao['PRODUCAO-BIBLIOGRAFICA']['ARTIGOS-PUBLICADOS']['B2']).encode("utf-8")
-        print "ARTIGOS-PUBLICADOS-QUALIS-B3:        ".decode("utf8") + str(self.__tabela_de_qualificacao['PRODUCAO-BIBLIOGRAFICA']['ARTIGOS-PUBLICADOS']['B3']).encode("utf-8")
-        print "ARTIGOS-PUBLICADOS-QUALIS-B4:        ".decode("utf8") + str(self.__tabela_de_qualificacao['PRODUCAO-BIBLIOGRAFICA']['ARTIGOS-PUBLICADOS']['B4']).encode("utf-8")
-        print "ARTIGOS-PUBLICADOS-QUALIS-B5:        ".decode("utf8") + str(self.__tabela_de_qualificacao['PRODUCAO-BIBLIOGRAFICA']['ARTIGOS-PUBLICADOS']['B5']).encode("utf-8")
-        print "ARTIGOS-PUBLICADOS-QUALIS-C:         ".decode("utf8") + str(self.__tabela_de_qualificacao['PRODUCAO-BIBLIOGRAFICA']['ARTIGOS-PUBLICADOS']['C']).encode("utf-8")
-        print "ARTIGOS-PUBLICADOS-SEM-QUALIS:       ".decode("utf8") + str(self.__tabela_de_qualificacao['PRODUCAO-BIBLIOGRAFICA']['ARTIGOS-PUBLICADOS']['NAO-ENCONTRADO']).encode("utf-8")
-
-        print "TRABALHOS-COMPLETOS-INTERNACIONAIS:  ".decode("utf8") + str(self.__tabela_de_qualificacao['PRODUCAO-BIBLIOGRAFICA']['TRABALHOS-EM-EVENTOS']['INTERNACIONAL']['COMPLETO']).encode("utf-8")
-        print "TRABALHOS-COMPLETOS-NACIONAIS:       ".decode("utf8") + str(self.__tabela_de_qualificacao['PRODUCAO-BIBLIOGRAFICA']['TRABALHOS-EM-EVENTOS']['NACIONAL']['COMPLETO']).encode("utf-8")
-        print "TRABALHOS-COMPLETOS-REGIONAIS:       ".decode("utf8") + str(self.__tabela_de_qualificacao['PRODUCAO-BIBLIOGRAFICA']['TRABALHOS-EM-EVENTOS']['REGIONAL']['COMPLETO']).encode("utf-8")
-        print "TRABALHOS-COMPLETOS-LOCAIS:          ".decode("utf8") + str(self.__tabela_de_qualificacao['PRODUCAO-BIBLIOGRAFICA']['TRABALHOS-EM-EVENTOS']['LOCAL']['COMPLETO']).encode("utf-8")
-        print "TRABALHOS-COMPLETOS-NAO-INFORMADO:   ".decode("utf8") + str(self.__tabela_de_qualificacao['PRODUCAO-BIBLIOGRAFICA']['TRABALHOS-EM-EVENTOS']['NAO_INFORMADO']['COMPLETO']).encode("utf-8")
-
-        print "TRABALHOS-EXPANDIDOS-INTERNACIONAIS: ".decode("utf8") + str(self.__tabela_de_qualificacao['PRODUCAO-BIBLIOGRAFICA']['TRABALHOS-EM-EVENTOS']['INTERNACIONAL']['RESUMO_EXPANDIDO']).encode("utf-8")
-        print "TRABALHOS-EXPANDIDOS-NACIONAIS:      ".decode("utf8") + str(self.__tabela_de_qualificacao['PRODUCAO-BIBLIOGRAFICA']['TRABALHOS-EM-EVENTOS']['NACIONAL']['RESUMO_EXPANDIDO']).encode("utf-8")
-        print "TRABALHOS-EXPANDIDOS-REGIONAIS:      ".decode("utf8") + str(self.__tabela_de_qualificacao['PRODUCAO-BIBLIOGRAFICA']['TRABALHOS-EM-EVENTOS']['REGIONAL']['RESUMO_EXPANDIDO']).encode("utf-8")
-        print "TRABALHOS-EXPANDIDOS-LOCAIS:         ".decode("utf8") + str(self.__tabela_de_qualificacao['PRODUCAO-BIBLIOGRAFICA']['TRABALHOS-EM-EVENTOS']['LOCAL']['RESUMO_EXPANDIDO']).encode("utf-8")
-        print "TRABALHOS-EXPANDIDOS-NAO-INFORMADO:  ".decode("utf8") + str(self.__tabela_de_qualificacao['PRODUCAO-BIBLIOGRAFICA']['TRABALHOS-EM-EVENTOS']['NAO_INFORMADO']['RESUMO_EXPANDIDO']).encode("utf-8")
-
-        print "TRABALHOS-RESUMOS-INTERNACIONAIS:    ".decode("utf8") + str(self.__tabela_de_qualificacao['PRODUCAO-BIBLIOGRAFICA']['TRABALHOS-EM-EVENTOS']['INTERNACIONAL']['RESUMO']).encode("utf-8")
-        print "TRABALHOS-RESUMOS-NACIONAIS:         ".decode("utf8") + str(self.__tabela_de_qualificacao['PRODUCAO-BIBLIOGRAFICA']['TRABALHOS-EM-EVENTOS']['NACIONAL']['RESUMO']).encode("utf-8")
-        print "TRABALHOS-RESUMOS-REGIONAIS:         ".decode("utf8") + str(self.__tabela_de_qualificacao['PRODUCAO-BIBLIOGRAFICA']['TRABALHOS-EM-EVENTOS']['REGIONAL']['RESUMO']).encode("utf-8")
-        print "TRABALHOS-RESUMOS-LOCAIS:            ".decode("utf8") + str(self.__tabela_de_qualificacao['PRODUCAO-BIBLIOGRAFICA']['TRABALHOS-EM-EVENTOS']['LOCAL']['RESUMO']).encode("utf-8")
-        print "TRABALHOS-RESUMOS-NAO-INFORMADO:     ".decode("utf8") + str(self.__tabela_de_qualificacao['PRODUCAO-BIBLIOGRAFICA']['TRABALHOS-EM-EVENTOS']['NAO_INFORMADO']['RESUMO']).encode("utf-8")
-
-        print "LIVROS-PUBLICADOS:                   ".decode("utf8") + str(self.__tabela_de_qualificacao['PRODUCAO-BIBLIOGRAFICA']['LIVROS-E-CAPITULOS']['LIVRO-PUBLICADO-OU-ORGANIZADO']['LIVRO_PUBLICADO']).encode("utf-8")
-        print "LIVROS-ORGANIZADOS:                  ".decode("utf8") + str(self.__tabela_de_qualificacao['PRODUCAO-BIBLIOGRAFICA']['LIVROS-E-CAPITULOS']['LIVRO-PUBLICADO-OU-ORGANIZADO']['LIVRO_ORGANIZADO_OU_EDICAO']).encode("utf-8")
-        print "CAPITULO-DE-LIVRO-PUBLICADO:         ".decode("utf8") + str(self.__tabela_de_qualificacao['PRODUCAO-BIBLIOGRAFICA']['LIVROS-E-CAPITULOS']['CAPITULO-DE-LIVRO-PUBLICADO']).encode("utf-8")
-
-        print "TRADUCOES:                           ".decode("utf8") + str(self.__tabela_de_qualificacao['PRODUCAO-BIBLIOGRAFICA']['DEMAIS-TIPOS-DE-PRODUCAO-BIBLIOGRAFICA']['TRADUCAO']).encode("utf-8")
-
-        print "SOFTWARES:                           ".decode("utf8") + str(self.__tabela_de_qualificacao['PRODUCAO-TECNICA']['SOFTWARE']).encode("utf-8")
-        print "PATENTES-DEPOSITADAS:                ".decode("utf8") + str(self.__tabela_de_qualificacao['PRODUCAO-TECNICA']['PATENTE']['DEPOSITADA']).encode("utf-8")
-        print "PATENTES-CONCEDIDAS:                 ".decode("utf8") + str(self.__tabela_de_qualificacao['PRODUCAO-TECNICA']['PATENTE']['CONCEDIDA']).encode("utf-8")
-        print "PRODUTOS-TECNOLOGICOS:               ".decode("utf8") + str(self.__tabela_de_qualificacao['PRODUCAO-TECNICA']['PRODUTO-TECNOLOGICO']).encode("utf-8")
-        print "PROCESSOS-OU-TECNICAS:               ".decode("utf8") + str(self.__tabela_de_qualificacao['PRODUCAO-TECNICA']['PROCESSOS-OU-TECNICAS']).encode("utf-8")
-        print "TRABALHOS-TECNICOS:                  ".decode("utf8") + str(self.__tabela_de_qualificacao['PRODUCAO-TECNICA']['TRABALHO-TECNICO']).encode("utf-8")
-
-        print "APRESENTACAO-DE-OBRA-ARTISTICA:      ".decode("utf8") + str(self.__tabela_de_qualificacao['OUTRA-PRODUCAO']['PRODUCAO-ARTISTICA-CULTURAL']['APRESENTACAO-DE-OBRA-ARTISTICA']).encode("utf-8")
-        print "COMPOSICAO-MUSICAL:                  ".decode("utf8") + str(self.__tabela_de_qualificacao['OUTRA-PRODUCAO']['PRODUCAO-ARTISTICA-CULTURAL']['COMPOSICAO-MUSICAL']).encode("utf-8")
-        print "OBRA-DE-ARTES-VISUAIS:               ".decode("utf8") + str(self.__tabela_de_qualificacao['OUTRA-PRODUCAO']['PRODUCAO-ARTISTICA-CULTURAL']['OBRA-DE-ARTES-VISUAIS']).encode("utf-8")
-
-
-        print "ORIENTACOES-PARA-POS-DOUTORADO:      ".decode("utf8") + str(self.__tabela_de_qualificacao['OUTRA-PRODUCAO']['ORIENTACOES-CONCLUIDAS']['ORIENTACOES-CONCLUIDAS-PARA-POS-DOUTORADO']).encode("utf-8")
-        print "ORIENTACOES-PARA-DOUTORADO:          ".decode("utf8") + str(self.__tabela_de_qualificacao['OUTRA-PRODUCAO']['ORIENTACOES-CONCLUIDAS']['ORIENTACOES-CONCLUIDAS-PARA-DOUTORADO']['ORIENTADOR_PRINCIPAL']).encode("utf-8")
-        print "ORIENTACOES-PARA-MESTRADO:           ".decode("utf8") + str(self.__tabela_de_qualificacao['OUTRA-PRODUCAO']['ORIENTACOES-CONCLUIDAS']['ORIENTACOES-CONCLUIDAS-PARA-MESTRADO']['ORIENTADOR_PRINCIPAL']).encode("utf-8")
-        print "CO-ORIENTACOES-PARA-DOUTORADO:       ".decode("utf8") + str(self.__tabela_de_qualificacao['OUTRA-PRODUCAO']['ORIENTACOES-CONCLUIDAS']['ORIENTACOES-CONCLUIDAS-PARA-DOUTORADO']['CO_ORIENTADOR']).encode("utf-8")
-        print "CO-ORIENTACOES-PARA-MESTRADO:        ".decode("utf8") + str(self.__tabela_de_qualificacao['OUTRA-PRODUCAO']['ORIENTACOES-CONCLUIDAS']['ORIENTACOES-CONCLUIDAS-PARA-MESTRADO']['CO_ORIENTADOR']).encode("utf-8")
-
-
-        print "ORIENTACOES-DE-ESPECIALIZACAO:       ".decode("utf8") + str(self.__tabela_de_qualificacao['OUTRA-PRODUCAO']['ORIENTACOES-CONCLUIDAS']['OUTRAS-ORIENTACOES-CONCLUIDAS']['MONOGRAFIA_DE_CONCLUSAO_DE_CURSO_APERFEICOAMENTO_E_ESPECIALIZACAO']).encode("utf-8")
-        print "ORIENTACOES-DE-TCC:                  ".decode("utf8") + str(self.__tabela_de_qualificacao['OUTRA-PRODUCAO']['ORIENTACOES-CONCLUIDAS']['OUTRAS-ORIENTACOES-CONCLUIDAS']['TRABALHO_DE_CONCLUSAO_DE_CURSO_GRADUACAO']).encode("utf-8")
-        print "ORIENTACOES-DE-INICIACAO-CIENTIFICA: ".decode("utf8") + str(self.__tabela_de_qualificacao['OUTRA-PRODUCAO']['ORIENTACOES-CONCLUIDAS']['OUTRAS-ORIENTACOES-CONCLUIDAS']['INICIACAO_CIENTIFICA']).encode("utf-8")
-        print "ORIENTACOES-DE-OUTRA-NATUREZA:       ".decode("utf8") + str(self.__tabela_de_qualificacao['OUTRA-PRODUCAO']['ORIENTACOES-CONCLUIDAS']['OUTRAS-ORIENTACOES-CONCLUIDAS']['ORIENTACAO-DE-OUTRA-NATUREZA']).encode("utf-8")
-
-        print "TOTAL:                               ".decode("utf8") + str(self.__score).encode("utf-8")
+        for rotulo, valor in self.get_tabela_de_qualificacao().items():
+            print (rotulo + ':').ljust(37) + str(valor)
+        print "TOTAL:".ljust(37) + str(self.__score)
+        if self.__pendentes:
+            minimo, maximo = self.get_acrescimos()
+            print ("PENDING (%d articles):" % len(self.__pendentes)).ljust(37) + "+%s to +%s" % (minimo, maximo)
+            for artigo in self.get_pendentes():
+                print "  %(ano)d DOI %(doi)s ISSN %(issn)s" % artigo
+        print ''
+
+def peso(caminho):
+    valor = weights
+    for chave in caminho:
+        valor = valor[chave]
+    return valor
+
+class Programa(object):
+    """Pontuação de um programa de pós-graduação, com cada produção de seus membros contada uma única vez"""
+    def __init__(self, nome, area):
+        self.__nome = nome
+        self.__area = area
+        self.__itens = OrderedDict() # identidade -> [caminho na tabela, número de membros que o declaram]
+        self.__membros = [] # (registro, identidades dos itens) de cada membro
+
+    # Junta os itens do membro aos dos anteriores por identidade, numa tabela
+    # hash. Um item declarado de formas diferentes (e.g., orientação e
+    # co-orientação da mesma tese) conta, no programa, pela de maior peso.
+    def adiciona(self, score):
+        chaves = set()
+        for chave, caminho in score.get_itens():
+            if chave in chaves:
+                continue
+            chaves.add(chave)
+            if chave not in self.__itens:
+                self.__itens[chave] = [caminho, 0]
+            elif peso(caminho) > peso(self.__itens[chave][0]):
+                self.__itens[chave][0] = caminho
+            self.__itens[chave][1] += 1
+        self.__membros.append( (score.get_registro(), chaves) )
+
+    def get_membros(self):
+        registros = []
+        for registro, chaves in self.__membros:
+            registro = dict(registro, membros=1, compartilhados=sum( 1 for chave in chaves if self.__itens[chave][1] > 1 ))
+            registros.append(registro)
+        return registros
+
+    # A soma dos pesos das produções distintas. Os limites de Bounds.py são
+    # por pesquisador e não se aplicam ao programa.
+    def get_tabela_de_qualificacao(self):
+        rotulos = dict( (caminho, rotulo) for rotulo, caminho in CAMPOS )
+        tabela = OrderedDict( (rotulo, 0) for rotulo, caminho in CAMPOS )
+        for caminho, n in self.__itens.values():
+            tabela[rotulos[caminho]] += peso(caminho)
+        return tabela
+
+    def get_registro(self):
+        tabela = self.get_tabela_de_qualificacao()
+        registro = { 'id': '', 'nome': self.__nome, 'area': self.__area, 'departamento': '', 'score': sum(tabela.values()),
+            'nao_encontrados': sum( 1 for caminho, n in self.__itens.values() if caminho[-1] == 'NAO-ENCONTRADO' ),
+            'membros': len(self.__membros), 'compartilhados': sum( 1 for caminho, n in self.__itens.values() if n > 1 ) }
+        registro.update(tabela)
+        return registro
+
+    def sumario(self):
+        registro = self.get_registro()
+        print self.__nome.encode("utf-8")
+        print "Membros: %d" % registro['membros']
+        print "Área de avaliação: " + self.__area
+        for rotulo, caminho in CAMPOS:
+            print (rotulo + ':').ljust(37) + str(registro[rotulo])
+        print "TOTAL:".ljust(37) + str(registro['score'])
+        print "SHARED:".ljust(37) + str(registro['compartilhados'])
         print ''
 
+def linha_csv(lattes_id, nome, score):
+    return "%s,%s,%f" % ( lattes_id, nome.upper(), score )
+
+# Writers stream one record (see Score.get_registro) per curriculum.
+class EscritorScore(object):
+    """Linha id,nome,score por currículo"""
+    def __init__(self, stream, colunas = COLUNAS):
+        self.__stream = stream
+
+    def escreve(self, registro):
+        self.__stream.write( linha_csv(registro['id'], registro['nome'], registro['score']) + '\n' )
+
+class EscritorCSV(object):
+    """Linha larga por currículo, com uma coluna por folha da tabela de qualificação"""
+    def __init__(self, stream, colunas = COLUNAS):
+        self.__colunas = colunas
+        self.__writer = csv.writer(stream)
+        self.__writer.writerow(colunas)
+
+    def escreve(self, registro):
+        valores = [ registro[coluna] for coluna in self.__colunas ]
+        valores = [ json.dumps(valor) if isinstance(valor, list) else valor for valor in valores ]
+        self.__writer.writerow([ valor.encode("utf-8") if isinstance(valor, unicode) else valor for valor in valores ])
+
+class EscritorJSONL(object):
+    """Objeto JSON por linha, com as chaves na ordem das colunas"""
+    def __init__(self, stream, colunas = COLUNAS):
+        self.__stream = stream
+        self.__colunas = colunas
+
+    def escreve(self, registro):
+        self.__stream.write( json.dumps(OrderedDict( (coluna, registro[coluna]) for coluna in self.__colunas )) + '\n' )
+
+ESCRITORES = { 'score': EscritorScore, 'csv': EscritorCSV, 'jsonl': EscritorJSONL }
+
+# State of each batch worker process, set once by _inicializa.
+_trabalhador = {}
+
+def _inicializa(inicio, fim, area, qualis, verbose, scheduler, backend_xml = None, duracao = None):
+    if isinstance(qualis, basestring): # a table exported by the parent process
+        qualis = QualisPeriodicos.anexa(qualis)
+    _trabalhador.update(inicio=inicio, fim=fim, area=area, qualis=qualis, verbose=verbose, scheduler=scheduler,
+        backend=backend(backend_xml), duracao=duracao)
+
+def _pontua(caminho):
+    t = _trabalhador
+    prazo = None if t['duracao'] is None else time.time() + t['duracao'] # the time budget starts at the parse
+    try:
+        with abre(caminho) as fonte:
+            raiz = t['backend'].parse(fonte)
+        score = Score(raiz, t['inicio'], t['fim'], t['area'], t['qualis'], t['verbose'], t['scheduler'], prazo)
+    except ERROS_DE_LEITURA as e: # unreadable file or XML; parse errors of both backends are SyntaxErrors
+        return caminho, None, str(e)
+    return caminho, score.get_registro(), None
+
+# Runs a task in a child process detached from the terminal and from the
+# caller's pipes, so that whoever reads our output is not kept waiting.
+def em_segundo_plano(registro, tarefa, *args):
+    sys.stdout.flush()
+    sys.stderr.flush()
+    if os.fork() != 0:
+        return
+    codigo = 1
+    try:
+        os.setsid()
+        nulo = os.open(os.devnull, os.O_RDWR)
+        log = os.open(registro, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0644)
+        os.dup2(nulo, 0)
+        os.dup2(log, 1)
+        os.dup2(log, 2)
+        tarefa(*args)
+        codigo = 0
+    except BaseException:
+        print >> sys.stderr, time.strftime('%Y-%m-%d %H:%M:%S') + ' background completion failed:'
+        traceback.print_exc()
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(codigo)
+
+# Failures of the background completion are appended to this file.
+def registro_de(manifesto):
+    return manifesto + '.log'
+
+# Re-scores, with no deadline, the curricula that had pending articles and
+# stores their final results in the manifest (Manifest.salva merges them,
+# under a lock, with whatever other runs wrote in the meantime). Articles
+# whose host is still blocked stay pending, and their curriculum is left out
+# of the manifest, to be scored again by the next run. The manifest is the
+# one the caller loaded before forking, so the results are discarded if a
+# newer run has meanwhile replaced it with other parameters.
+def _conclui(caminhos, manifest, area, inicio, fim, edicoes, scheduler, backend_xml):
+    _inicializa(inicio, fim, area, QualisPeriodicos(edicoes, [area]), 0, scheduler, backend_xml)
+    for caminho in caminhos:
+        caminho, resultado, erro = _pontua(caminho)
+        if erro is not None:
+            print >> sys.stderr, caminho + ': ' + erro
+        elif resultado['pendentes']:
+            print >> sys.stderr, caminho + ': %d articles still pending' % len(resultado['pendentes'])
+        else:
+            manifest.atualiza(caminho, resultado)
+    if not manifest.salva():
+        print >> sys.stderr, 'manifest replaced by a run with other parameters; results discarded'
+
+def _conclui_score(score, caminho, manifest):
+    score.resolve_pendentes()
+    if score.get_pendentes():
+        print >> sys.stderr, caminho + ': %d articles still pending' % len(score.get_pendentes())
+        return
+    manifest.atualiza(caminho, score.get_registro())
+    if not manifest.salva():
+        print >> sys.stderr, 'manifest replaced by a run with other parameters; results discarded'
+
+# The curricula (XML or ZIP) under a directory. With recentes, only the newest
+# file of each curriculum, by DATA-ATUALIZACAO, found by reading file headers
+# alone (see Index.py); duplicate and stale copies are never parsed in full.
+# Headers are kept in the manifest, if any, so unchanged files are not read.
+def seleciona(diretorio, recentes = False, verbose = 0, manifest = None):
+    caminhos = curriculos(diretorio)
+    if not recentes:
+        return caminhos
+    indice = Indice(caminhos, manifest)
+    for caminho, erro in indice.get_erros():
+        print >> sys.stderr, caminho + ': ' + erro
+    if verbose == 1:
+        print >> sys.stderr, '%d files, %d skipped as duplicate or stale' % (len(caminhos), len(indice.get_descartados()))
+    return indice.get_caminhos()
+
+# Everything a cached result depends on besides the curriculum itself.
+def assinatura_parametros(area, inicio, fim, edicoes):
+    qualis_csv = [ (ano, os.path.getsize(arquivo_qualis(ano)), os.path.getmtime(arquivo_qualis(ano))) for ano in edicoes ]
+    return assinatura(area, inicio, fim, sorted(edicoes), qualis_csv, weights, bounds)
+
+# Re-scores only the new or changed curricula of a directory, reusing the
+# manifest for the others, and rewrites the consolidated CSV. With more than
+# one job, curricula are scored by a process pool sharing the same scheduler
+# and the same memory-mapped Qualis table, loaded once by this process.
+# Records are also fed, as they stream out, to the optional statistics.
+# With a time budget per curriculum (duracao, in seconds), curricula with
+# pending articles are written with their provisional score but are not
+# kept in the manifest; a background process re-scores them and stores the
+# final results, which the next refresh reuses.
+def refresh(diretorio, manifesto, saida, formato, area, inicio, fim, edicoes, verbose = 0, jobs = 1, scheduler = None, estatisticas = None, backend_xml = None, duracao = None, recentes = False):
+    parametros = assinatura_parametros(area, inicio, fim, edicoes)
+    manifest = Manifest(manifesto, parametros)
+
+    caminhos = seleciona(diretorio, recentes, verbose, manifest)
+    entradas = [ (caminho,) + manifest.consulta(caminho) for caminho in caminhos ]
+    pendentes = [ caminho for caminho, resultado, st in entradas if resultado is None ]
+
+    if scheduler is None:
+        scheduler = Scheduler()
+    # The temporary Qualis table and the workers are released even if scoring
+    # or writing fails, or the user interrupts the run.
+    pool = None
+    mapa = None
+    provisorios = []
+    try:
+        if jobs > 1 and len(pendentes) > 1:
+            descritor, mapa = tempfile.mkstemp(prefix='qualis-periodicos-', suffix='.bin')
+            os.close(descritor)
+            QualisPeriodicos(edicoes, [area]).exporta(mapa)
+            pool = multiprocessing.Pool(min(jobs, len(pendentes)), _inicializa, (inicio, fim, area, mapa, verbose, scheduler, backend_xml, duracao))
+            pontuados = pool.imap(_pontua, pendentes)
+        else:
+            if pendentes: # Qualis is only loaded if some curriculum must be scored
+                _inicializa(inicio, fim, area, QualisPeriodicos(edicoes, [area]), verbose, scheduler, backend_xml, duracao)
+            pontuados = itertools.imap(_pontua, pendentes)
+
+        # Results come back in the order of the files, so the output is streamed
+        with open(saida + '.tmp', 'wb') as stream:
+            escritor = ESCRITORES[formato](stream, COLUNAS if duracao is None else COLUNAS + PENDENTES)
+            for caminho, resultado, st in entradas:
+                if resultado is None:
+                    caminho, resultado, erro = next(pontuados)
+                    if erro is not None:
+                        print >> sys.stderr, caminho + ': ' + erro
+                        continue
+                    if resultado['pendentes']:
+                        provisorios.append(caminho)
+                    else:
+                        manifest.atualiza(caminho, resultado, st)
+                escritor.escreve(resultado)
+                if estatisticas is not None and not resultado.get('pendentes'): # provisional scores would skew them
+                    estatisticas.adiciona(resultado)
+        os.rename(saida + '.tmp', saida)
+        if pool is not None:
+            pool.close()
+    finally:
+        if pool is not None:
+            pool.terminate() # all results are in, or the run failed: workers are no longer needed
+            pool.join()
+        if mapa is not None:
+            os.remove(mapa)
+        if os.path.exists(saida + '.tmp'):
+            os.remove(saida + '.tmp')
+
+    manifest.mantem(caminhos)
+    manifest.salva()
+    if verbose == 1:
+        print >> sys.stderr, '%d curricula, %d scored, %d unchanged' % (len(caminhos), len(pendentes), len(caminhos) - len(pendentes))
+        if provisorios:
+            print >> sys.stderr, '%d provisional, completing in the background%s' % (len(provisorios), '' if estatisticas is None else ' (left out of the statistics)')
+    if provisorios:
+        em_segundo_plano(registro_de(manifesto), _conclui, provisorios, manifest, area, inicio, fim, edicoes, scheduler, backend_xml)
+
+# Scores the curricula under a directory as the faculty of one program, in a
+# single pass. Members share the classification of articles, so each distinct
+# article is looked up once, and their items are joined by identity into the
+# program's record, written after the members' own.
+def programa(diretorio, stream, formato, area, inicio, fim, edicoes, verbose = 0, scheduler = None, backend_xml = None, recentes = False):
+    qualis = QualisPeriodicos(edicoes, [area])
+    leitor = backend(backend_xml)
+    classificacoes = {}
+    resultado = Programa(os.path.basename(os.path.normpath(diretorio)), area)
+    for caminho in seleciona(diretorio, recentes, verbose):
+        try:
+            with abre(caminho) as fonte:
+                raiz = leitor.parse(fonte)
+            score = Score(raiz, inicio, fim, area, qualis, verbose, scheduler, None, classificacoes)
+        except ERROS_DE_LEITURA as e:
+            print >> sys.stderr, caminho + ': ' + str(e)
+            continue
+        if score.get_pendentes(): # their hosts asked for a longer wait than the scheduler accepts
+            print >> sys.stderr, caminho + ': %d articles left out, their hosts are blocked' % len(score.get_pendentes())
+        resultado.adiciona(score)
+        if verbose == 1:
+            score.sumario()
+
+    if verbose == 1:
+        resultado.sumario()
+        return
+    escritor = ESCRITORES[formato](stream, COLUNAS + MEMBROS)
+    for registro in resultado.get_membros() + [resultado.get_registro()]:
+        escritor.escreve(registro)
+
+def years(text):
+    try:
+        return [ int(year) for year in text.split(',') ]
+    except ValueError:
+        raise argparse.ArgumentTypeError("invalid year list: '%s'" % text)
+
+def seconds(text):
+    m = re.match(r'^\s*([0-9]*\.?[0-9]+)\s*(ms|s|m)?\s*$', text)
+    if m is None:
+        raise argparse.ArgumentTypeError("invalid duration: '%s'" % text)
+    return float(m.group(1)) * {'ms': 0.001, 's': 1, 'm': 60, None: 1}[m.group(2)]
+
 def main():
     # Define program arguments
     parser = argparse.ArgumentParser(description="Computes scores from Lattes curricula.")
     parser.add_argument('area', metavar='AREA', type=str, nargs=1,
         help="specify Qualis Periodicos area")
-    parser.add_argument('istream', metavar='FILE', type=argparse.FileType('r'), default=sys.stdin,
+    parser.add_argument('istream', metavar='FILE', type=argparse.FileType('r'), default=sys.stdin, nargs='?',
         help="XML file containing a Lattes curriculum")
     parser.add_argument('-v', '--verbose', action='count',
         help="explain what is being done")
     parser.add_argument('--version', action='version', version='%(prog)s 0.1')
-    parser.add_argument('-p', '--qualis-periodicos', dest='ano_qualis_periodicos', default=[2015], metavar='YYYY', type=int, nargs=1,
-        help="employ Qualis Periodicos from year YYYY")
-    parser.add_argument('-s', '--since-year', dest='since', default=-1, metavar='YYYY', type=int, nargs=1,
+    parser.add_argument('-p', '--qualis-periodicos', dest='ano_qualis_periodicos', default=[[2015]], metavar='YYYY[,YYYY...]', type=years, nargs=1,
+        help="employ Qualis Periodicos from year(s) YYYY; each article is classified by the latest edition not after its year")
+    parser.add_argument('-s', '--since-year', dest='since', default=[-1], metavar='YYYY', type=int, nargs=1,
         help="consider academic productivity since year YYYY")
-    parser.add_argument('-u', '--until-year', dest='until', default=date.today().year, metavar='YYYY', type=int, nargs=1,
+    parser.add_argument('-u', '--until-year', dest='until', default=[date.today().year], metavar='YYYY', type=int, nargs=1,
         help="consider academic productivity until year YYYY")
+    parser.add_argument('-r', '--refresh', dest='refresh', metavar='DIR',
+        help="score the XML (or ZIP) curricula under DIR, re-scoring only new or changed files, and rewrite the consolidated CSV")
+    parser.add_argument('-g', '--program', dest='program', metavar='DIR',
+        help="score the XML (or ZIP) curricula under DIR as the members of one graduate program: each member's score, then the "
+            "program's, in which productions shared by members count once")
+    parser.add_argument('-l', '--latest', dest='latest', action='store_true',
+        help="with --refresh or --program, score only the newest file of each curriculum by DATA-ATUALIZACAO, "
+            "skipping duplicate and stale copies after reading their headers only")
+    parser.add_argument('-m', '--manifest', dest='manifest', default='scoreLattes-manifest.json', metavar='FILE',
+        help="manifest of previous results used by --refresh (default: %(default)s)")
+    parser.add_argument('-o', '--output', dest='output', default='scoreLattes.csv', metavar='FILE',
+        help="consolidated output written by --refresh (default: %(default)s)")
+    parser.add_argument('-j', '--jobs', dest='jobs', default=1, metavar='N', type=int,
+        help="score curricula with N worker processes in --refresh (default: %(default)s)")
+    parser.add_argument('--max-connections', dest='max_connections', default=8, metavar='N', type=int,
+        help="at most N simultaneous DOI requests, shared by all workers (default: %(default)s)")
+    parser.add_argument('--host-rate', dest='host_rate', default=2.0, metavar='R', type=float,
+        help="at most R requests per second to each host, shared by all workers (default: %(default)s)")
+    parser.add_argument('--stats', dest='stats', metavar='FILE',
+        help="write mergeable per-area and per-department statistics of --refresh to FILE (see Statistics.py)")
+    parser.add_argument('-f', '--format', dest='format', default='score', choices=sorted(ESCRITORES.keys()),
+        help="output one 'id,name,score' line, one wide CSV row or one JSON object per curriculum (default: %(default)s)")
+    parser.add_argument('-b', '--backend', dest='backend', default=backend().nome, choices=sorted(BACKENDS.keys()),
+        help="XML parser: lxml with precompiled XPath queries, or the standard library (default: %(default)s)")
+    parser.add_argument('--deadline', dest='deadline', metavar='T', type=seconds,
+        help="score each curriculum within T (e.g. 2s, 500ms): local lookups first, then DOI requests while time remains; "
+            "articles left unresolved are reported with the range they may add, resolved in the background and cached in the manifest")
 
     reload(sys)
     sys.setdefaultencoding('utf-8')
 
     # Process arguments
     args = parser.parse_args()
+    # Members share article classifications in one process, and a program
+    # record has no provisional form: neither workers nor a deadline apply.
+    if args.program is not None and args.deadline is not None:
+        parser.error("argument --deadline: not supported with --program")
+    if args.program is not None and args.jobs != 1:
+        parser.error("argument -j/--jobs: not supported with --program")
+
+    scheduler = Scheduler(taxa=args.host_rate, conexoes=args.max_connections)
+    if args.refresh is not None:
+        estatisticas = None
+        if args.stats is not None:
+            estatisticas = Estatisticas(['score', 'nao_encontrados'] + [ rotulo for rotulo, caminho in CAMPOS ])
+        refresh(args.refresh, args.manifest, args.output, args.format, args.area[0], args.since[0], args.until[0],
+            args.ano_qualis_periodicos[0], args.verbose, args.jobs, scheduler, estatisticas, args.backend, args.deadline, args.latest)
+        if estatisticas is not None:
+            estatisticas.salva(args.stats)
+        return
+
+    if args.program is not None:
+        programa(args.program, sys.stdout, args.format, args.area[0], args.since[0], args.until[0],
+            args.ano_qualis_periodicos[0], args.verbose, scheduler, args.backend, args.latest)
+        return
+
+    if args.deadline is None:
+        root = backend(args.backend).parse(args.istream)
+        qualis = QualisPeriodicos(args.ano_qualis_periodicos[0], [args.area[0]])
+        score = Score(root, args.since[0], args.until[0], args.area[0], qualis, args.verbose, scheduler)
+
+        if args.verbose == 1:
+            score.sumario()
+        else:
+            ESCRITORES[args.format](sys.stdout).escreve( score.get_registro() )
+        return
+
+    # With a deadline, final results of files are cached in the manifest, so a
+    # curriculum whose pending articles were resolved in the background is
+    # answered at once the next time. The time budget covers the whole run,
+    # loading the Qualis tables included.
+    prazo = time.time() + args.deadline
+    escritor = ESCRITORES[args.format](sys.stdout, COLUNAS + PENDENTES)
+    caminho = None if args.istream is sys.stdin else args.istream.name
+    if caminho is not None:
+        parametros = assinatura_parametros(args.area[0], args.since[0], args.until[0], args.ano_qualis_periodicos[0])
+        manifest = Manifest(args.manifest, parametros)
+        resultado, st = manifest.consulta(caminho)
+        if resultado is not None and args.verbose != 1:
+            escritor.escreve(resultado)
+            return
 
-    tree = ET.parse(args.istream)
-    root = tree.getroot()
-    score = Score(root, args.since[0], args.until[0], args.area[0], args.ano_qualis_periodicos[0], args.verbose)
+    qualis = QualisPeriodicos(args.ano_qualis_periodicos[0], [args.area[0]])
+    root = backend(args.backend).parse(args.istream)
+    score = Score(root, args.since[0], args.until[0], args.area[0], qualis, args.verbose, scheduler, prazo)
 
     if args.verbose == 1:
         score.sumario()
     else:
-        print "%s,%s,%f" % ( score.get_lattes_id(), score.get_name().upper(), score.get_score() )
+        escritor.escreve( score.get_registro() )
+
+    if caminho is None:
+        return
+    if score.get_pendentes():
+        em_segundo_plano(registro_de(args.manifest), _conclui_score, score, caminho, manifest)
+    else:
+        manifest.atualiza(caminho, score.get_registro(), st)
+        manifest.salva()
 
 # Main
 if __name__ == "__main__":